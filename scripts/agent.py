@@ -6,108 +6,17 @@ __version__ = "1.0.0"
 
 from network import Network
 from my_constants import *
-import os
+from belief import update_believes, new_item_update, new_items_update
+from frontier import KernelScorer, KERNELS
+from planner import Planner
+from trajectory import TrajectoryRecorder
+import os, json
+from collections import deque
+from contextlib import contextmanager, nullcontext
 from threading import Thread
 import numpy as np
-import matplotlib.pyplot as plt
 import time
 
-# Defining a function to update believes
-def update_believes(x, y, cell_val, w, h, believes, item_found):
-    """ Update the believes'grid of the robot
-
-    Args:
-        x (int): robot x-position
-        y (int): robot y-positions
-        cell_val (float): value of the cell in the environment
-        w (int): environment largeur
-        h (int): environment height
-        believes (ndarray): believes' grid of the robot
-        item_found (bool): whether an item as been found or not
-
-    Returns:
-        ndarray: the believes' grid of the robot
-    """
-    # Updating belief for the current cell
-    believes[x, y] = 0
-    # Updating believes for other cells in map
-    for i in range(w): # For all columns in the map
-        for j in range(h): # For all cells in one column
-            if x-1 <= i and i <= x+1 and y-1 <= j and j <= y+1: # If that cell is one cell away from the robot
-                if cell_val in [0, 0.25]: # No item can be one cell away of these cell values
-                    believes[i, j] = 0
-                elif cell_val in [0.3] and item_found == False: # Not when reupdating for 0.3 because box values are dominant over 0.25 and 0.5
-                    believes[i, j] = 0
-            elif x-2 <= i and i <= x+2 and y-2 <= j and j <= y+2: # If that cell is two cells away from the robot
-                if cell_val in [0]: # No item can be two cells away of this cell value
-                    believes[i, j] = 0
-                elif cell_val in [0.5, 0.6] and item_found == False: # If a new item is found, focus on it
-                    believes[i, j] = 0
-            else: # If that cell is far away from the robot and the robot found none-zero values (Focus on the item close to robot)
-                if cell_val in [0.25, 0.3, 0.5, 0.6] and item_found == False:
-                    believes[i, j] = 0
-    return believes
-
-# Defining a function to update known cell values
-def update_known_values(x, y, w, h, found_item_type, found_cell_values):
-    """
-    Update the known cell values in the map
-
-    Args:
-        x (int): robot x-position
-        y (int): robot y-position
-        w (int): environment largeur
-        h (int): environment height
-        found_item_type: type of the item 
-        found_cell_values (ndarray): array containing the locations of the items
-
-    Returns:
-        ndarray: the found cell values 
-    """
-    for i in range(w): # For all columns in the map
-        for j in range(h): # For all cells in one column
-            if x-1 <= i and i <= x+1 and y-1 <= j and j <= y+1: # If that cell is one cell away from the item
-                if found_item_type == KEY_TYPE and found_cell_values[i, j] not in [0.3, 0.6, 1]: # Box values are dominant
-                    found_cell_values[i, j] = 0.5
-                elif found_item_type == BOX_TYPE and found_cell_values[i, j] not in [1]: # 1 is dominant
-                    found_cell_values[i, j] = 0.6
-            elif x-2 <= i and i <= x+2 and y-2 <= j and j <= y+2: # If that cell is two cells away from the item
-                if found_item_type == KEY_TYPE and found_cell_values[i, j] not in [0.3, 0.5, 0.6, 1]: # These values are dominant
-                    found_cell_values[i, j] = 0.25
-                elif found_item_type == BOX_TYPE and found_cell_values[i, j] not in [0.6, 1]: # These values are dominant
-                    found_cell_values[i, j] = 0.3
-    found_cell_values[x, y] = 1
-    return found_cell_values
-
-# Defining a function to reset+update believes and update found_cell_values when a new item is found
-def new_item_update(x, y, w, h, found_item_type, believes, explo, cell_values, found_cell_values):
-    """Reset and updtate the believes' grid and update the found cell values when a new item is found
-
-    Args:
-        x (int): robot x-position
-        y (int): robot y-position
-        w (int): environment largeur
-        h (int): environment height
-        found_item_type: type of the item 
-        believes (ndarray): believes' grid of the robot
-        explo (ndarray): exploration map of the robot
-        cell_values (tuple): array containing every cell values of the environement
-        found_cell_values (ndarray): array containing the locations of the items
-
-    Returns:
-        (ndarray, ndarray): believes' grid of the robot and the found cell values 
-    """
-    # Updating known cell values to ignore this newly found item
-    found_cell_values = update_known_values(x, y, w, h, found_item_type, found_cell_values)
-    # Resetting believes to serch for a new item
-    believes = np.ones((w, h))
-    for i in range(w): # For all columns in the map
-        for j in range(h): # For all cells in one column
-            # Ajusting new believes considering cell visited before finding the target
-            if explo[i, j] == 1:
-                believes = update_believes(i, j, cell_values[i, j], w, h, believes, True)
-    return believes, found_cell_values
-
 def delete_files(folder_path):
     """
     Delete all files in a given folder
@@ -129,26 +38,126 @@ def delete_files(folder_path):
             print('Failed to delete %s. Reason: %s' % (file_path, e))
     
 
+class PhaseTimer:
+    """ Wall time spent by the robot in each phase of its control loop, optionally with a cProfile of some of the steps
+
+    Phases can be nested (update_believes is part of explore_cell): the time of a phase includes its nested phases.
+    """
+    def __init__(self, profile_every=0):
+        """
+        Args:
+            profile_every (int, optional): profile one step every N steps with cProfile, 0 to disable. Defaults to 0.
+        """
+        self.phases = {}    # Name of the phase -> [number of calls, total time, max time]
+        self.steps = 0
+        self.start = time.perf_counter()
+        self.profile_every = profile_every
+        self.profiler = None
+        if profile_every > 0:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self.profiling = False
+
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.phases.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+
+    def begin_step(self):
+        """ Called at the beginning of every step of the control loop """
+        if self.profiler is not None and self.steps % self.profile_every == 0:
+            self.profiling = True
+            self.profiler.enable()
+
+
+    def end_step(self):
+        """ Called at the end of every step of the control loop """
+        if self.profiling:
+            self.profiler.disable()
+            self.profiling = False
+        self.steps += 1
+
+
+    def summary(self, top=15):
+        """ Summary of the run: time of each phase and, if profiled, the functions with the highest cumulative time """
+        summary = {
+            "steps": self.steps,
+            "duration_s": time.perf_counter() - self.start,
+            "phases": {name: {"calls": calls, "total_s": total, "mean_us": total/calls*1e6, "max_us": maximum*1e6, "per_step_us": total/max(self.steps, 1)*1e6}
+                       for name, (calls, total, maximum) in self.phases.items()},
+        }
+        if self.profiler is not None:
+            import pstats
+            stats = pstats.Stats(self.profiler)
+            functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:top]   # (file, line, function) -> (primitive calls, calls, total time, cumulative time, callers)
+            summary["profile"] = {"sampled_steps": (self.steps + self.profile_every - 1)//self.profile_every,
+                                  "top": [{"function": f"{os.path.basename(file)}:{line}({function})", "calls": calls, "cumulative_s": cumulative}
+                                          for (file, line, function), (_, calls, _, cumulative, _) in functions]}
+        return summary
+
+
+    def write(self, path):
+        """ Write the summary to a JSON file, and the profile next to it (path + ".prof") """
+        with open(path, "w") as summary_file:
+            json.dump(self.summary(), summary_file, indent=1)
+        if self.profiler is not None:
+            self.profiler.dump_stats(path + ".prof")
+
+
+class NullTimer:
+    """ Same interface as PhaseTimer, records nothing """
+    def phase(self, name):
+        return nullcontext()
+
+    def begin_step(self):
+        pass
+
+    def end_step(self):
+        pass
+
+
 class Agent:
     """ Class that implements the behaviour of each agent based on their perception and communication with other agents """
-    def __init__(self, server_ip):
+    def __init__(self, server_ip, scoring="inverse_square", network=None, threaded=True, timer=None):
+        """
+        Args:
+            server_ip (str): ip address of the server
+            scoring (str, optional): kernel used to score the cells to explore. Defaults to "inverse_square".
+            network (optional): transport to use instead of connecting to the server (same interface as Network). Defaults to None.
+            threaded (bool, optional): handle the broadcast messages in a background thread, otherwise the caller has to \
+                give them to handle_msg. Defaults to True.
+            timer (PhaseTimer, optional): records the time spent in each phase, nothing is recorded if None. Defaults to None.
+        """
 
         #DO NOT TOUCH THE FOLLOWING INSTRUCTIONS
-        self.network = Network(server_ip=server_ip)
+        self.network = network if network is not None else Network(server_ip=server_ip)
         self.agent_id = self.network.id
         self.running = True
+        self.timer = timer if timer is not None else NullTimer()
         self.network.send({"header": GET_DATA})
         env_conf = self.network.receive()
         self.x, self.y = env_conf["x"], env_conf["y"]   #initial agent position
         self.w, self.h = env_conf["w"], env_conf["h"]   #environment dimensions
         self.cell_val = env_conf["cell_val"] #value of the cell the agent is located in
-        Thread(target=self.msg_cb, daemon=True).start()
+        self.updates = deque()  #broadcasts waiting to be applied by the control loop (only appended by msg_cb)
+        if threaded:
+            Thread(target=self.msg_cb, daemon=True).start()
        
         self.explo = np.zeros((env_conf["w"], env_conf["h"])) # Matrix of the explorated cells (0: not explorated, 1: explorated)
         self.believes = np.ones((env_conf["w"], env_conf["h"])) # Matrix of believes (0: no item can be there, 1: it is possible that there is an item)
         # Note: If the agent finds a new non zero value, it will focus on this item and put zeros everywhere far from its location even if there may be \
         # other items there. It will remove these "false zeros" after it found the item it was looking for.
         self.cell_values = np.zeros((env_conf["w"], env_conf["h"])) # Matrix of visited cell values to display on the map and to reupdate believes
+        self.explored_believes = np.ones((env_conf["w"], env_conf["h"])) # Matrix of believes only constrained by the explored cells (used to reset believes when a new item is found)
         self.found_cell_values = np.zeros((env_conf["w"], env_conf["h"])) # Matrix of known cell values to ignore already found items
         self.found_item_type = None # Type of the item that has just been found (0: key, 1: box)
         self.found_item_owner = None # Id of the owner of the item that has just been found
@@ -158,48 +167,77 @@ class Agent:
         self.box_position = None # Coordinates of the robot's box
         self.key_collected = False # Flag to tell if the key has been collected by the robot
         self.box_reached = False # Flag to tell if the box has been reached with the key and that the quest is completed
+        self.scorer = KernelScorer(self.w, self.h, KERNELS[scoring]) # Scoring backend of the exploring algorithm
+        self.obstacles = np.zeros((env_conf["w"], env_conf["h"]), dtype=bool) # Matrix of the obstacles the robot bumped into
+        self.planner = Planner(self.w, self.h) # Moves towards the key and the box
+        # Only the discovered items are useful to the robot, the other broadcasts are not sent to it
+        self.network.request({"header": SUBSCRIBE, "types": [KEY_DISCOVERED, BOX_DISCOVERED]})
 
 
     def msg_cb(self): 
-        """ Method used to handle incoming messages """
+        """ Method used to receive the messages broadcast by the other robots (the replies of the server are handled by choose_action) """
         while self.running:
-            msg = self.network.receive()
+            msg = self.network.receive_broadcast()
             print(msg)
+            self.handle_msg(msg)
 
-            if msg["header"] == MOVE:
-                # Update variables
-                self.x, self.y = msg["x"], msg["y"]
-                self.cell_val = msg["cell_val"]
-            
-            elif msg["header"] == GET_ITEM_OWNER:
-                # The robot found a new item
-                self.found_item_type = msg["type"]
-                self.found_item_owner = msg["owner"]
-                # Updating believes and found_cell_values
-                self.believes, self.found_cell_values = new_item_update(self.x, self.y, self.w, self.h, self.found_item_type, self.believes,
-                                                                        self.explo, self.cell_values, self.found_cell_values)
-                # Checking if the item belongs to this robot
-                if self.found_item_owner == self.agent_id:
-                    if self.found_item_type == KEY_TYPE:
-                        self.key_position = (self.x, self.y)
-                        self.key_collected = True
-                    elif self.found_item_type == BOX_TYPE:
-                        self.box_position = (self.x, self.y)
-                        if self.key_collected is True:
-                            self.box_reached = True
-                # Tell the other robots about this item
-                self.broadcast_message_flag = True
-            
-            elif msg["header"] == BROADCAST_MSG and msg["Msg type"] in [KEY_DISCOVERED, BOX_DISCOVERED]: # If another robot found an item
-                # Updating believes and found_cell_values
-                self.believes, self.found_cell_values = new_item_update(msg["position"][0], msg["position"][1], self.w, self.h, msg["Msg type"]-1, self.believes,
-                                                                        self.explo, self.cell_values, self.found_cell_values)
+
+    def apply_updates(self):
+        """ Apply the broadcasts received since the last call, must be called by the control loop at every tick
+
+        The state of the robot is only written by the control loop: the other thread only queues the broadcasts. When \
+        several items were discovered since the last tick, the believes' grid is reset once for all of them.
+        """
+        items = []
+        while self.updates:
+            msg = self.updates.popleft()
+            if msg["Msg type"] in [KEY_DISCOVERED, BOX_DISCOVERED]: # If another robot found an item
+                items.append((msg["position"][0], msg["position"][1], msg["Msg type"]-1))
                 # Checking if the item belongs to this robot
                 if msg["owner"] == self.agent_id:
                     if msg["Msg type"] == KEY_DISCOVERED:
                         self.key_position = msg["position"]
                     if msg["Msg type"] == BOX_DISCOVERED:
                         self.box_position = msg["position"]
+        # Updating believes and found_cell_values
+        self.believes, self.found_cell_values = new_items_update(items, self.w, self.h, self.believes, self.explo, self.cell_values,
+                                                                 self.found_cell_values, self.explored_believes)
+
+
+    def handle_msg(self, msg):
+        """ Update the state of the robot with a message received from the server or from another robot """
+        if msg["header"] == MOVE:
+            # Update variables
+            self.x, self.y = msg["x"], msg["y"]
+            self.cell_val = msg["cell_val"]
+        
+        elif msg["header"] == STEP:
+            # Keep the position reached by this robot at the end of the batch of moves
+            for moved_id, x, y, cell_val in zip(msg["agents"], msg["x"], msg["y"], msg["cell_val"]):
+                if moved_id == self.agent_id:
+                    self.x, self.y, self.cell_val = x, y, cell_val
+        
+        elif msg["header"] == GET_ITEM_OWNER:
+            # The robot found a new item
+            self.found_item_type = msg["type"]
+            self.found_item_owner = msg["owner"]
+            # Updating believes and found_cell_values
+            self.believes, self.found_cell_values = new_item_update(self.x, self.y, self.w, self.h, self.found_item_type, self.believes,
+                                                                    self.explo, self.cell_values, self.found_cell_values, self.explored_believes)
+            # Checking if the item belongs to this robot
+            if self.found_item_owner == self.agent_id:
+                if self.found_item_type == KEY_TYPE:
+                    self.key_position = (self.x, self.y)
+                    self.key_collected = True
+                elif self.found_item_type == BOX_TYPE:
+                    self.box_position = (self.x, self.y)
+                    if self.key_collected is True:
+                        self.box_reached = True
+            # Tell the other robots about this item
+            self.broadcast_message_flag = True
+        
+        elif msg["header"] == BROADCAST_MSG: # Applied by the control loop (see apply_updates)
+            self.updates.append(msg)
 
 
     def cell2move(self, chosen_next_cell):
@@ -246,14 +284,8 @@ class Agent:
         Returns:
             dict: the robot's best move message
         """
-        max_distance = np.linalg.norm([self.w, self.h])
-        for i in range(self.x-1, self.x+2): # For colums maximum one cell away
-            for j in range(self.y-1, self.y+2): # For rows maximum one cell away
-                if i in range(self.w) and j in range(self.h): # If the indexes are inside the map
-                    distance = np.linalg.norm([target_position[0]-i, target_position[1]-j]) # Calculate the distance to the key
-                    if distance < max_distance:
-                        chosen_next_cell = (i, j)
-                        max_distance = distance
+        # Cell of the 3x3 window the closest to the target (distance field of the target, computed once)
+        chosen_next_cell = self.planner.next_cell(self.x, self.y, target_position)
         # Convert cell coordinates into move
         return self.cell2move(chosen_next_cell)
     
@@ -284,7 +316,9 @@ class Agent:
         self.explo[self.x, self.y] = 1
 
         # Updating believes
-        self.believes = update_believes(self.x, self.y, self.cell_val, self.w, self.h, self.believes, known_cell_val)
+        with self.timer.phase("update_believes"):
+            self.believes = update_believes(self.x, self.y, self.cell_val, self.w, self.h, self.believes, known_cell_val)
+            self.explored_believes = update_believes(self.x, self.y, self.cell_val, self.w, self.h, self.explored_believes, True)
 
     
     def explore_map(self):
@@ -294,26 +328,38 @@ class Agent:
         Returns:
             tuple: the robot's move message
         """
-        max_weighted_sum = 0
+        chosen_next_cell = self.best_neighbour()
+        if chosen_next_cell is None and not self.believes.any() and self.explored_believes.any():
+            # The robot focused on the signals of two different items: remove the "false zeros" and score again
+            self.believes = self.explored_believes.copy()
+            chosen_next_cell = self.best_neighbour()
+        if chosen_next_cell is None and (self.believes == 1).any():
+            # The scores of the neighbours are all zero (e.g. the gaussian kernel far from every cell with a belief of 1): go towards the closest of these cells
+            xs, ys = np.nonzero(self.believes == 1)
+            closest = np.argmin(np.maximum(np.abs(xs - self.x), np.abs(ys - self.y)))
+            chosen_next_cell = self.planner.next_cell(self.x, self.y, (xs[closest], ys[closest]))
+        if chosen_next_cell is None: # Nothing left to explore
+            chosen_next_cell = (self.x, self.y)
+        # Convert cell coordinates into move
+        return self.cell2move(chosen_next_cell)
+
+
+    def best_neighbour(self):
+        """ Neighbour cell with the highest score, None if every neighbour is an obstacle or has a score of zero """
+        self.scorer.update(self.believes) # Attraction field of the cells with a belief of 1
+        chosen_next_cell = None
+        max_weighted_sum = self.scorer.atol # Lower scores are rounding errors of the scorer, not cells with a belief of 1
         for i in range(self.x-1, self.x+2): # For colums maximum one cell away
             for j in range(self.y-1, self.y+2): # For rows maximum one cell away
-                if i in range(self.w) and j in range(self.h) and (i, j) != (self.x, self.y): # If the indexes are inside the map and the cell is not the current cell
-                    
-                    # Count number of cells with a belief of 1 around that cell (sum of 1/distances^2)
-                    weighted_sum = 0 
-                    
-                    for ii in range(self.w): # For all columns in the map
-                        for jj in range(self.h): # For all cells in this column
-                            if self.believes[ii, jj] == 1: # If that cell has a belief of 1
-                                distance2 = (ii-i)**2 + (jj-j)**2 # Calculate the squared distance between these cells
-                                weighted_sum += 1/(distance2+0.0000001) # Greater weight for closer cells
-                    
-                    if weighted_sum > max_weighted_sum:
+                if i in range(self.w) and j in range(self.h) and (i, j) != (self.x, self.y) and not self.obstacles[i, j]: # If the indexes are inside the map and the cell is not the current cell nor an obstacle
+
+                    # Count number of cells with a belief of 1 around that cell (sum of kernel weights, 1/distances^2 by default)
+                    weighted_sum = self.scorer.score(i, j)
+
+                    if self.scorer.is_better(weighted_sum, max_weighted_sum): # Ties are broken in favour of the first cell
                         chosen_next_cell = (i, j)
                         max_weighted_sum = weighted_sum
-                        
-        # Convert cell coordinates into move
-        return self.cell2move(chosen_next_cell)
+        return chosen_next_cell
 
 
     def choose_action(self):
@@ -342,113 +388,52 @@ class Agent:
         
         # Find the best next move to explore the map     
         else:
-            next_move = self.explore_map()
+            with self.timer.phase("explore_map"):
+                next_move = self.explore_map()
         
         # Execute chosen action
-        self.network.send(next_move)
+        if next_move["header"] == BROADCAST_MSG:    # Broadcasts are not answered
+            self.network.send(next_move)
+        else:   # Wait for the reply so that the next step starts from an up to date state
+            with self.timer.phase("network"):
+                reply = self.network.request(next_move)
+            if next_move["header"] == MOVE and next_move["direction"] != STAND and (reply["x"], reply["y"]) == (self.x, self.y):
+                # The move was refused: the cell is an obstacle
+                dx, dy = MOVES[next_move["direction"]]
+                self.add_obstacle(self.x + dx, self.y + dy)
+            self.handle_msg(reply)
+
+
+    def add_obstacle(self, x, y):
+        """ Remember that a cell cannot be crossed: it is not explored anymore and the paths go around it """
+        self.obstacles[x, y] = True
+        self.believes[x, y] = 0 # No item can be on an obstacle
+        self.explored_believes[x, y] = 0
+        self.planner.set_obstacles(self.obstacles)
 
 
     def plot_believes(self, alpha=1.0, display=True):
         """
-        Plot the believes' grid of the robot
+        Plot the believes' grid of the robot (see visualization.py)
 
         Args:
             alpha (float, optional): Opacity of the window (1.0=vivid, 0.0=transparent). Defaults to 1.0.
             display (bool, optional): display the grid on the screen. Defaults to True.
         """
-        # Enable interactive mode to continue execution of the code after the plot is shown
-        # Note: The "block" parameter on the "plt.show()" function doesn't seem to work on macOS.     
-        if display: # If we want to display the plot         
-            plt.ion()
-        
-        plt.figure(self.agent_id+1, figsize=(self.w/3, self.h/3))
-        plt.clf() # Clear the matplotlib plot every time the robot moves
-        
-        # Creating colormap with explored cells and the agent's position
-        colormap = np.copy(self.explo)
-        colormap[self.x, self.y] = 3
-        
-        colors = ["Reds", "Blues", "Greens", "Oranges"]
-        cmap = colors[self.agent_id]
-        
-        if self.key_position or self.box_position:
-            if self.key_position:
-                colormap[self.key_position[0], self.key_position[1]] = 2
-            if self.box_position:
-                colormap[self.box_position[0], self.box_position[1]] = 2
-        
-        plt.pcolormesh(np.flip(colormap.T, 0), cmap=cmap, edgecolors='k', vmin=0, vmax=3, alpha=alpha)
-    
-        # Creating array with cell values in visited cells and believes elsewhere
-        cellval_or_belief = np.maximum(self.believes, self.cell_values)
-        
-        if not self.box_reached:   # If the box hasn't been reached yet    
-            # Adding cell values or believes as annotations on every cell
-            for i in range(self.w):
-                for j in range(self.h):
-                    if (i, self.w-(j+1)) == (self.x, self.y):
-                        plt.annotate(str(round(np.flip(cellval_or_belief.T, 0)[j][i], 1)), xy=(i+0.5, j+0.5), ha='center', va='center', color='white')
-                    else:
-                        plt.annotate(str(round(np.flip(cellval_or_belief.T, 0)[j][i], 1)), xy=(i+0.5, j+0.5), ha='center', va='center', color='black')
-            
-            # Add total number of visited cells and other important information
-            plt.annotate(f'Number of visited cells: {int(np.sum(self.explo))}', xy=(0,-1), color='black', annotation_clip=False)
-            plt.annotate(f'Position of the key: {self.key_position}', xy=(0,-2), color='black', annotation_clip=False)
-            plt.annotate(f'Position of the box: {self.box_position}', xy=(0,-3), color='black', annotation_clip=False)
-            plt.annotate(f'Key collected: {self.key_collected}', xy=(0,-4), color='black', annotation_clip=False)
-            plt.annotate(f'Box reached with key: {self.box_reached}', xy=(0,-5), color='black', annotation_clip=False)
-            
-        else:   # If the box has been reached
-            text = "Congrats! The robot reached its box!\nPress any key in the terminal to exit..."
-            plt.text(self.w/2, self.h/2, text, ha='center', va='center', color='black', fontsize=18, fontweight='bold')
-            
-        plt.axis('equal')
-        plt.axis('off')
-        plt.title(f'GridBelieves for robot {self.agent_id+1}')
-        plt.tight_layout() # Reduce margins
-        
-        if display: # If we want to display the plot 
-            plt.draw()
-        
-        foldername = "robot" + str(self.agent_id+1)
-        full_path = os.path.join(IMG_PATH, foldername)
-        
-        if not os.path.exists(full_path):   # Check if the folder doesn't exist
-            os.makedirs(full_path)          # Create the directory
-        
-        filename = "explo_" + str(int(np.sum(self.explo))) + ".jpg"
-        plt.savefig(IMG_PATH + "/" + foldername + "/" + filename)
-        
-        if display:         # If we want to display the plot 
-            plt.pause(0.2)  # Necessary for the plot to appear on macOS
+        from visualization import plot_believes
+        plot_believes(self, IMG_PATH, alpha, display)
 
     
-    def pathGIF(self):
-        import imageio
-        import re
-   
-        foldername = "robot" + str(self.agent_id+1)
-        full_path = os.path.join(IMG_PATH, foldername)
-        
-        if not os.path.exists(full_path):   # Check if the folder doesn't exist
-            os.makedirs(full_path)          # Create the directory
-        
-        filenameGIF = "complete_path_robot_" + str(self.agent_id+1) + ".gif"
-        GIF_path = IMG_PATH + "/" + foldername + "/" + filenameGIF   # GIF file relative path
+    def pathGIF(self, trajectory_path, every=1):
+        """
+        Create a GIF of the path of the robot from its trajectory log (see visualization.py)
 
-        def natural_sort_key(string):    # Function to sort the images based on their number
-            return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', string)]
-        
-        image_files = sorted(os.listdir(full_path), key=natural_sort_key) # List all files in the images directory
-        images = [] # Create a list to store images
-        
-        # Read each image and append it to the images list
-        for image_file in image_files:
-            image_path = os.path.join(full_path, image_file)
-            images.append(imageio.imread(image_path))
-        
-        imageio.mimsave(GIF_path, images)   # Create a GIF of the robot path
-        print(f'GIF created and saved to {GIF_path}')
+        Args:
+            trajectory_path (str): file written by the TrajectoryRecorder of the robot
+            every (int, optional): keep one step every N steps. Defaults to 1.
+        """
+        from visualization import path_gif
+        path_gif(self.agent_id, IMG_PATH, trajectory_path, every)
 
 
 if __name__ == "__main__":
@@ -456,28 +441,52 @@ if __name__ == "__main__":
        
     IMG_PATH = "./Images"
     
-    if not os.path.exists(IMG_PATH):    # Check if the folder doesn't exist
-        os.makedirs(IMG_PATH)           # Create the directory
-
-    for foldername in os.listdir(IMG_PATH): # Check if there is folders in the directory
-        folder_path = os.path.join(IMG_PATH, foldername)
-        delete_files(folder_path)   # Delete every files in the folder specified
-        
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--server_ip", help="Ip address of the server", type=str, default="localhost")
+    parser.add_argument("-s", "--scoring", help="Kernel used to score the cells to explore", type=str, default="inverse_square", choices=list(KERNELS))
+    parser.add_argument("-p", "--plot_every", help="Also save the believes' grid as an image every N steps (and when an item is found), 0 to disable", type=int, default=0)
+    parser.add_argument("--timing", help="Record the time spent in each phase of the control loop and write a summary to this JSON file", type=str, default=None)
+    parser.add_argument("--profile_every", help="With --timing, also profile one step every N steps with cProfile (0 to disable)", type=int, default=0)
     args = parser.parse_args()
-    agent = Agent(args.server_ip)
+    timer = PhaseTimer(args.profile_every) if args.timing is not None else None
+    agent = Agent(args.server_ip, args.scoring, timer=timer)
+    # Only the folder of this robot is cleaned: the other robots may already be writing their logs in theirs
+    robot_path = os.path.join(IMG_PATH, "robot" + str(agent.agent_id+1))
+    if not os.path.exists(robot_path):  # Check if the folder doesn't exist
+        os.makedirs(robot_path)         # Create the directory
+    delete_files(robot_path)    # Delete every files of the previous run
+    trajectory_path = os.path.join(robot_path, "trajectory.bin")
+    recorder = TrajectoryRecorder(trajectory_path, agent) # Compact log of every step, used to create the GIF
+    plotter = None
+    if args.plot_every > 0: # Plotting libraries are only imported when the images are saved during the run
+        from visualization import BeliefPlotter
+        plotter = BeliefPlotter(agent, IMG_PATH, args.plot_every)
     
     try:
         while not agent.box_reached:
-            agent.explore_cell()
-            agent.plot_believes(display=False)
+            agent.timer.begin_step()
+            with agent.timer.phase("apply_updates"):
+                agent.apply_updates() # Broadcasts received since the last step
+            with agent.timer.phase("explore_cell"):
+                agent.explore_cell()
+            with agent.timer.phase("record"):
+                recorder.record(agent)
+                if plotter is not None:
+                    plotter.update(agent) # Rendered in the background, only every N steps or on important events
             # time.sleep(0.5)
-            agent.choose_action()
-            time.sleep(0.1) # Added time sleep to allow for receiving incoming message in other thread before next iteration
-        agent.plot_believes(alpha=0.5)
+            with agent.timer.phase("choose_action"):
+                agent.choose_action() # Returns once the server replied, the robot steps as fast as the server answers
+            agent.timer.end_step()
+        recorder.record(agent)
+        recorder.close()
+        if plotter is not None:
+            plotter.close()
+        with agent.timer.phase("plot_believes"):
+            agent.plot_believes(alpha=0.5)
+        if timer is not None:
+            timer.write(args.timing)
         input("Press any key to exit...")
-        agent.pathGIF()
+        agent.pathGIF(trajectory_path)
         
     except KeyboardInterrupt:
         pass
\ No newline at end of file
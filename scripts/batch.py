@@ -0,0 +1,116 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Batch evaluation: sweep maps, agent counts and seeds with in-process episodes run in parallel """
+
+import argparse, csv, itertools, os, random, traceback
+from multiprocessing import Pool
+import numpy as np
+
+from simulation import run_episode
+from map_generator import resolve_map, is_generated
+
+
+COLUMNS = ["map_id", "nb_agents", "seed", "completed", "steps", "steps_to_completion", "cells_visited",
+           "distinct_cells_visited", "requests", "broadcasts", "duration", "error"]
+
+
+def run_job(job):
+    """
+    Run one episode of the sweep (executed in a worker process)
+
+    Args:
+        job (tuple): (map_id, nb_agents, seed, max_steps)
+
+    Returns:
+        dict: row of the results file
+    """
+    map_id, nb_agents, seed, max_steps = job
+    row = {"map_id": map_id, "nb_agents": nb_agents, "seed": seed, "error": ""}
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        metrics = run_episode(nb_agents, resolve_map(map_id, nb_agents, seed), max_steps)
+        row.update({key: metrics[key] for key in COLUMNS if key in metrics and key not in row})
+        # Lists are stored in a single column
+        row["steps_to_completion"] = ";".join("" if step is None else str(step) for step in metrics["steps_to_completion"])
+        row["cells_visited"] = ";".join(str(nb) for nb in metrics["cells_visited"])
+    except Exception:
+        row["error"] = traceback.format_exc(limit=1).strip().splitlines()[-1]
+    return row
+
+
+def load_results(path):
+    """ Rows of the results file, empty if it does not exist yet """
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as results:
+        return list(csv.DictReader(results))
+
+
+def write_results(path, rows):
+    """ Replace the results file with these rows (written to a temporary file first, the file is never left half written) """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="") as results:
+        writer = csv.DictWriter(results, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def run_sweep(path, map_ids, agent_counts, seeds, max_steps=5000, processes=None):
+    """
+    Run every episode of the sweep that is not already in the results file and append the results as they finish
+
+    The episodes that ended with an error are run again: their rows are removed from the file before the sweep. The agents \
+    are deterministic, so the maps of the config file are only run with the first seed (the seed only changes generated maps).
+
+    Args:
+        path (str): CSV file of the results, created if needed
+        map_ids (list): maps to load: ids of the config file or sizes of generated maps ("200x200")
+        agent_counts (list): numbers of agents
+        seeds (list): seeds of the episodes
+        max_steps (int, optional): maximum number of steps of an episode. Defaults to 5000.
+        processes (int, optional): number of worker processes. Defaults to the number of cores.
+
+    Returns:
+        int: number of episodes run
+    """
+    seeds = list(seeds)
+    if len(seeds) > 1 and not all(is_generated(str(map_id)) for map_id in map_ids):
+        print(f"Warning: the maps of the config file give the same episode with every seed, they are only run with seed {seeds[0]}")
+    rows = load_results(path)
+    failed = [row for row in rows if row["error"]]
+    if failed:     #retried below
+        rows = [row for row in rows if not row["error"]]
+        write_results(path, rows)
+    done = {(row["map_id"], int(row["nb_agents"]), int(row["seed"])) for row in rows}
+    jobs = [(map_id, nb_agents, seed, max_steps) for map_id, nb_agents in itertools.product(map_ids, agent_counts)
+            for seed in (seeds if is_generated(str(map_id)) else seeds[:1]) if (str(map_id), nb_agents, seed) not in done]
+    print(f"{len(done)} episodes already done, {len(failed)} failed episodes to retry, {len(jobs)} to run")
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="") as results, Pool(processes) as pool:
+        writer = csv.DictWriter(results, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+        for row in pool.imap_unordered(run_job, jobs):
+            writer.writerow(row)
+            results.flush()     #an interrupted sweep keeps every finished episode and can be resumed
+    return len(jobs)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="CSV file of the results (resumed if it already exists)", type=str, default="results.csv")
+    parser.add_argument("-mi", "--map_ids", help="Maps to load: ids of the config file or sizes of generated maps (e.g. 1 2 50x50)", type=str, nargs="+", default=["1", "2"])
+    parser.add_argument("-nb", "--nb_agents", help="Numbers of agents", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("-s", "--seeds", help="Number of seeds per configuration (only for the generated maps)", type=int, default=1)
+    parser.add_argument("-m", "--max_steps", help="Maximum number of steps of an episode", type=int, default=5000)
+    parser.add_argument("-j", "--processes", help="Number of worker processes (defaults to the number of cores)", type=int, default=None)
+    args = parser.parse_args()
+
+    run_sweep(args.output, args.map_ids, args.nb_agents, range(args.seeds), args.max_steps, args.processes)
@@ -0,0 +1,196 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" This file contains the belief engine of the agents: every update is done with slice and mask operations on the grids """
+
+from my_constants import *
+import numpy as np
+
+
+def window(x, y, radius, w, h):
+    """
+    Compute the slices of the square window of a given Chebyshev radius around a cell, clipped to the map
+
+    Args:
+        x (int): x-position of the center of the window
+        y (int): y-position of the center of the window
+        radius (int): Chebyshev radius of the window
+        w (int): environment width
+        h (int): environment height
+
+    Returns:
+        (slice, slice): the slices to use on a (w, h) grid
+    """
+    return slice(max(x-radius, 0), min(x+radius+1, w)), slice(max(y-radius, 0), min(y+radius+1, h))
+
+
+# Value written around a newly found item for each ring, with the values that are dominant over it and must be kept
+KNOWN_VALUES_PRECEDENCE = {
+    KEY_TYPE: ((KEY_NEIGHBOUR_PERCENTAGE, [0.3, 0.6, 1]), (KEY_NEIGHBOUR_PERCENTAGE/2, [0.3, 0.5, 0.6, 1])),  # Box values are dominant
+    BOX_TYPE: ((BOX_NEIGHBOUR_PERCENTAGE, [1]), (BOX_NEIGHBOUR_PERCENTAGE/2, [0.6, 1]))    # 1 is dominant
+}
+
+
+def dilate(mask, radius):
+    """
+    Grow a boolean mask by a given Chebyshev radius (separable max filter along both axes)
+
+    Args:
+        mask (ndarray): boolean grid
+        radius (int): Chebyshev radius of the dilation
+
+    Returns:
+        ndarray: the dilated mask
+    """
+    for axis in range(mask.ndim):
+        grown = mask.copy()
+        n = mask.shape[axis]
+        for shift in range(1, min(radius, n-1)+1):
+            src_lo, src_hi = [slice(None)]*mask.ndim, [slice(None)]*mask.ndim
+            src_lo[axis], src_hi[axis] = slice(0, n-shift), slice(shift, n)
+            grown[tuple(src_hi)] |= mask[tuple(src_lo)]
+            grown[tuple(src_lo)] |= mask[tuple(src_hi)]
+        mask = grown
+    return mask
+
+
+# Defining a function to update believes
+def update_believes(x, y, cell_val, w, h, believes, item_found):
+    """ Update the believes'grid of the robot
+
+    Args:
+        x (int): robot x-position
+        y (int): robot y-positions
+        cell_val (float): value of the cell in the environment
+        w (int): environment largeur
+        h (int): environment height
+        believes (ndarray): believes' grid of the robot
+        item_found (bool): whether an item as been found or not
+
+    Returns:
+        ndarray: the believes' grid of the robot
+    """
+    ring_1 = window(x, y, 1, w, h) # Cells one cell away from the robot (robot cell included)
+    ring_2 = window(x, y, 2, w, h) # Cells at most two cells away from the robot
+
+    # Which part of the map has to be set to zero
+    clear_ring_1 = cell_val in [0, 0.25] or (cell_val in [0.3] and item_found == False) # Not when reupdating for 0.3 because box values are dominant over 0.25 and 0.5
+    clear_ring_2 = cell_val in [0] or (cell_val in [0.5, 0.6] and item_found == False) # If a new item is found, focus on it
+    clear_far_field = cell_val in [0.25, 0.3, 0.5, 0.6] and item_found == False # Focus on the item close to robot
+
+    if clear_far_field: # Everything outside the 5x5 window is set to zero
+        kept = believes[ring_2].copy()
+        believes[:, :] = 0
+        believes[ring_2] = kept
+    if clear_ring_2: # Only the cells exactly two cells away are set to zero
+        kept = believes[ring_1].copy()
+        believes[ring_2] = 0
+        believes[ring_1] = kept
+    if clear_ring_1:
+        believes[ring_1] = 0
+    # Updating belief for the current cell
+    believes[x, y] = 0
+    return believes
+
+# Defining a function to update known cell values
+def update_known_values(x, y, w, h, found_item_type, found_cell_values):
+    """
+    Update the known cell values in the map
+
+    Args:
+        x (int): robot x-position
+        y (int): robot y-position
+        w (int): environment largeur
+        h (int): environment height
+        found_item_type: type of the item
+        found_cell_values (ndarray): array containing the locations of the items
+
+    Returns:
+        ndarray: the found cell values
+    """
+    if found_item_type in KNOWN_VALUES_PRECEDENCE:
+        (ring_1_val, ring_1_dominant), (ring_2_val, ring_2_dominant) = KNOWN_VALUES_PRECEDENCE[found_item_type]
+        ring_1 = window(x, y, 1, w, h) # Cells one cell away from the item
+        ring_2 = window(x, y, 2, w, h) # Cells at most two cells away from the item
+        inner = found_cell_values[ring_1].copy()
+        # Cells two cells away from the item (the cells one cell away are overwritten below)
+        outer = found_cell_values[ring_2]
+        outer[~np.isin(outer, ring_2_dominant)] = ring_2_val
+        # Cells one cell away from the item
+        found_cell_values[ring_1] = np.where(np.isin(inner, ring_1_dominant), inner, ring_1_val)
+    found_cell_values[x, y] = 1
+    return found_cell_values
+
+# Defining a function to combine the constraints of every explored cell
+def explored_constraints(explo, cell_values):
+    """
+    Compute the believes' grid that only takes the explored cells into account (same result as replaying \
+    update_believes with item_found=True on every explored cell)
+
+    Args:
+        explo (ndarray): exploration map of the robot
+        cell_values (ndarray): array containing every cell values of the environement
+
+    Returns:
+        ndarray: the believes' grid of the robot
+    """
+    explored = explo == 1
+    believes = np.ones(explo.shape)
+    believes[dilate(explored & (cell_values == 0), 2)] = 0 # No item can be two cells away of a 0
+    believes[dilate(explored & np.isin(cell_values, [0, 0.25]), 1)] = 0 # No item can be one cell away of a 0 or a 0.25
+    believes[explored] = 0
+    return believes
+
+# Defining a function to reset+update believes and update found_cell_values when a new item is found
+def new_item_update(x, y, w, h, found_item_type, believes, explo, cell_values, found_cell_values, explored_believes=None):
+    """Reset and updtate the believes' grid and update the found cell values when a new item is found
+
+    Args:
+        x (int): robot x-position
+        y (int): robot y-position
+        w (int): environment largeur
+        h (int): environment height
+        found_item_type: type of the item
+        believes (ndarray): believes' grid of the robot
+        explo (ndarray): exploration map of the robot
+        cell_values (tuple): array containing every cell values of the environement
+        found_cell_values (ndarray): array containing the locations of the items
+        explored_believes (ndarray, optional): believes' grid only constrained by the explored cells, kept up to date by the agent. \
+            Rebuilt from explo and cell_values if None. Defaults to None.
+
+    Returns:
+        (ndarray, ndarray): believes' grid of the robot and the found cell values
+    """
+    return new_items_update([(x, y, found_item_type)], w, h, believes, explo, cell_values, found_cell_values, explored_believes)
+
+# Defining a function to update believes when several items are found at once
+def new_items_update(items, w, h, believes, explo, cell_values, found_cell_values, explored_believes=None):
+    """Same as new_item_update for several items: the found cell values are updated for each item, the believes' grid is reset once
+
+    Args:
+        items (list): (x, y, type) of every found item, in the order they were found
+        w (int): environment largeur
+        h (int): environment height
+        believes (ndarray): believes' grid of the robot
+        explo (ndarray): exploration map of the robot
+        cell_values (tuple): array containing every cell values of the environement
+        found_cell_values (ndarray): array containing the locations of the items
+        explored_believes (ndarray, optional): see new_item_update. Defaults to None.
+
+    Returns:
+        (ndarray, ndarray): believes' grid of the robot and the found cell values
+    """
+    if not items:
+        return believes, found_cell_values
+    # Updating known cell values to ignore these newly found items
+    for x, y, found_item_type in items:
+        found_cell_values = update_known_values(x, y, w, h, found_item_type, found_cell_values)
+    # Resetting believes to serch for a new item
+    if explored_believes is not None: # Constraints of the explored cells already combined by the agent
+        believes = explored_believes.copy()
+    else:
+        believes = explored_constraints(explo, cell_values)
+    return believes, found_cell_values
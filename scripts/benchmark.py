@@ -0,0 +1,203 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Benchmarks of the belief engine, the exploring algorithm and the game, across grid sizes and numbers of items
+
+Every case is timed on a generated map (same seed every run): the number of calls of a timing is calibrated so that it
+lasts at least min_time, and the median of the repeated timings is kept. The results are written to a JSON file and can
+be compared with a saved baseline: the exit code is 1 if a case is slower than the baseline by more than the tolerance.
+"""
+
+import argparse, itertools, json, platform, sys, time
+import numpy as np
+
+from my_constants import *
+from belief import update_believes, update_known_values, new_item_update
+from game import Game
+from agent import Agent
+from simulation import LocalServer
+from map_generator import generate_map
+
+
+SIZES = [20, 50, 100, 200, 500]
+ITEMS = [1, 4, 16]  #number of agents, each of them has a key and a box
+NB_INPUTS = 256     #the calls of a case cycle through this number of random inputs
+
+
+def positions(rng, size):
+    return [(int(x), int(y)) for x, y in rng.integers(0, size, (NB_INPUTS, 2))]
+
+
+def belief_cases(size, rng):
+    """ Cases of the belief engine: (name, function called by the timer) """
+    cells = positions(rng, size)
+    values = rng.choice([0, 0.25, 0.3, 0.5, 0.6, 1], NB_INPUTS)
+    believes = np.ones((size, size))
+    explo = (rng.random((size, size)) < 0.3).astype(float)
+    cell_values = explo*rng.choice([0, 0.25, 0.3, 0.5, 0.6], (size, size))
+    found_cell_values = np.zeros((size, size))
+    inputs = itertools.cycle(range(NB_INPUTS))
+
+    def run_update_believes():
+        i = next(inputs)
+        update_believes(*cells[i], values[i], size, size, believes, False)
+
+    def run_update_known_values():
+        i = next(inputs)
+        update_known_values(*cells[i], size, size, i % 2, found_cell_values)
+
+    def run_new_item_update():
+        i = next(inputs)
+        new_item_update(*cells[i], size, size, i % 2, believes, explo, cell_values, found_cell_values, believes)
+
+    def run_new_item_update_rebuild():  #believes rebuilt from the explored cells
+        i = next(inputs)
+        new_item_update(*cells[i], size, size, i % 2, believes, explo, cell_values, found_cell_values)
+
+    return [("update_believes", run_update_believes), ("update_known_values", run_update_known_values),
+            ("new_item_update", run_new_item_update), ("new_item_update_rebuild", run_new_item_update_rebuild)]
+
+
+def explore_map_case(size, rng):
+    """ Exploring algorithm: one cell of the believes' grid changes before every call, as after a move """
+    server = LocalServer(1, generate_map(size, size, 1, seed=0))
+    agent = Agent(None, network=server.connect(), threaded=False)
+    cells = positions(rng, size)
+    inputs = itertools.cycle(range(NB_INPUTS))
+
+    def run_explore_map():
+        agent.x, agent.y = cells[next(inputs)]
+        agent.believes[agent.x, agent.y] = 1 - agent.believes[agent.x, agent.y]
+        agent.explore_map()
+
+    return [("explore_map", run_explore_map)]
+
+
+def game_cases(size, nb_agents, rng):
+    """ Cases of the game: loading the map and processing the requests of the agents """
+    map_cfg = generate_map(size, size, nb_agents, seed=0)
+    game = Game(nb_agents, map_cfg, headless=True)
+    requests = {
+        "process_move": [{"header": MOVE, "direction": int(direction)} for direction in rng.integers(0, 9, NB_INPUTS)],
+        "process_get_data": [{"header": GET_DATA}],
+        "process_get_item_owner": [{"header": GET_ITEM_OWNER}],
+        "process_step": [{"header": STEP, "directions": [int(direction) for direction in rng.integers(0, 9, 8)]} for _ in range(NB_INPUTS)],
+    }
+    cases = [("load_map", lambda: game.load_map(map_cfg))]
+    for name, messages in requests.items():
+        inputs = itertools.cycle([(msg, i % nb_agents) for i, msg in enumerate(messages*nb_agents)])
+        cases.append((name, lambda inputs=inputs: game.process(*next(inputs))))
+    return cases
+
+
+def measure(function, repeat=5, min_time=0.05):
+    """
+    Time a function
+
+    Args:
+        function (callable): function to time, called without arguments
+        repeat (int, optional): number of timings. Defaults to 5.
+        min_time (float, optional): minimum duration of a timing in seconds. Defaults to 0.05.
+
+    Returns:
+        dict: median and minimum time of a call (in microseconds) and number of calls of a timing
+    """
+    number = 1
+    while True:     #calibration: double the number of calls until a timing lasts long enough
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start)/number*1e6)
+    return {"median_us": float(np.median(timings)), "min_us": min(timings), "calls": number}
+
+
+def run_benchmarks(sizes=SIZES, items=ITEMS, cases=None, repeat=5, min_time=0.05, seed=0):
+    """
+    Run the benchmark suite
+
+    Args:
+        sizes (list, optional): sizes of the square maps. Defaults to SIZES.
+        items (list, optional): numbers of agents (each with a key and a box) of the cases of the game. Defaults to ITEMS.
+        cases (list, optional): only run the cases whose name contains one of these strings, all of them if None. Defaults to None.
+        repeat (int, optional): number of timings of a case. Defaults to 5.
+        min_time (float, optional): minimum duration of a timing in seconds. Defaults to 0.05.
+        seed (int, optional): seed of the random inputs. Defaults to 0.
+
+    Returns:
+        dict: "meta" (environment of the run) and "results" (case -> measure), cases are named "name/size=N[/items=M]"
+    """
+    results = {}
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        suites = [("", belief_cases(size, rng) + explore_map_case(size, rng))]
+        suites += [(f"/items={nb_agents}", game_cases(size, nb_agents, rng)) for nb_agents in items if 3*nb_agents <= size*size]
+        for suffix, suite in suites:
+            for name, function in suite:
+                if cases is not None and not any(case in name for case in cases):
+                    continue
+                key = f"{name}/size={size}{suffix}"
+                results[key] = measure(function, repeat, min_time)
+                print(f"{key:<45} {results[key]['median_us']:12.1f} us")
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "repeat": repeat, "min_time": min_time, "seed": seed}
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare the results with a baseline
+
+    Args:
+        results (dict): results of run_benchmarks
+        baseline (dict): results of a previous run
+        tolerance (float, optional): a case is a regression if it is slower than the baseline by more than this fraction. Defaults to 0.2.
+
+    Returns:
+        list: (case, baseline time, time, ratio) of the regressions
+    """
+    regressions = []
+    for key, measure_ in results["results"].items():
+        if key not in baseline["results"]:
+            continue
+        reference = baseline["results"][key]["median_us"]
+        ratio = measure_["median_us"]/reference if reference > 0 else 1
+        flag = "REGRESSION" if ratio > 1 + tolerance else ("faster" if ratio < 1/(1 + tolerance) else "")
+        print(f"{key:<45} {reference:12.1f} -> {measure_['median_us']:12.1f} us  x{ratio:5.2f}  {flag}")
+        if ratio > 1 + tolerance:
+            regressions.append((key, reference, measure_["median_us"], ratio))
+    return regressions
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="JSON file of the results", type=str, default="benchmark.json")
+    parser.add_argument("-b", "--baseline", help="JSON file of a previous run to compare with", type=str, default=None)
+    parser.add_argument("--sizes", help="Sizes of the square maps", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--items", help="Numbers of agents (each with a key and a box) of the game cases", type=int, nargs="+", default=ITEMS)
+    parser.add_argument("-c", "--cases", help="Only run the cases whose name contains one of these strings", type=str, nargs="+", default=None)
+    parser.add_argument("-r", "--repeat", help="Number of timings of a case", type=int, default=5)
+    parser.add_argument("--min_time", help="Minimum duration of a timing in seconds", type=float, default=0.05)
+    parser.add_argument("-t", "--tolerance", help="Slowdown over the baseline reported as a regression (0.2 = 20%%)", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.items, args.cases, args.repeat, args.min_time)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=1)
+    print(f"Results saved to {args.output}")
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
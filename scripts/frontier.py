@@ -0,0 +1,85 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" This file contains the scoring backends used by the agents to choose which cell to explore next """
+
+import numpy as np
+
+
+# Radial kernels: weight given to a cell with a belief of 1 as a function of its squared distance
+def inverse_square(distance2):
+    """ Greater weight for closer cells (sum of 1/distances^2) """
+    return 1/(distance2+0.0000001)
+
+def inverse_distance(distance2):
+    """ Slower decay than inverse_square: far unexplored areas keep attracting the robot """
+    return 1/(np.sqrt(distance2)+0.0000001)
+
+def gaussian(distance2, sigma=3):
+    """ Only the cells a few steps away from the robot are taken into account """
+    return np.exp(-distance2/(2*sigma**2))
+
+KERNELS = {"inverse_square": inverse_square, "inverse_distance": inverse_distance, "gaussian": gaussian}
+
+
+class KernelScorer:
+    """ Attraction field of the cells with a belief of 1, computed as the convolution of the believes' mask with a radial kernel """
+    def __init__(self, w, h, kernel=inverse_square, max_incremental=32):
+        """
+        Args:
+            w (int): environment width
+            h (int): environment height
+            kernel (function, optional): weight of a belief as a function of the squared distance. Defaults to inverse_square.
+            max_incremental (int, optional): maximum number of changed believes for which the field is updated cell by cell \
+                instead of being recomputed with a FFT. Defaults to 32.
+        """
+        self.w, self.h = w, h
+        self.max_incremental = max_incremental
+        # Kernel sampled on every offset between two cells of the map, centered on (w-1, h-1)
+        dx, dy = np.meshgrid(np.arange(-(w-1), w), np.arange(-(h-1), h), indexing="ij")
+        self.kernel = kernel((dx**2 + dy**2).astype(float))
+        # The weight of a belief on its own cell is kept out of the convolution: it is usually much bigger than the others \
+        # and would dominate the rounding errors of the FFT
+        self.center = self.kernel[w-1, h-1]
+        self.kernel[w-1, h-1] = 0
+        # A FFT size of (2w-1, 2h-1) is enough: the offsets needed by the cells of the map never wrap around
+        self.fft_shape = self.kernel.shape
+        self.kernel_fft = np.fft.rfft2(self.kernel, s=self.fft_shape)
+        # Scores below this are rounding errors of the FFT, not cells with a belief of 1 (e.g. the gaussian kernel far from every belief)
+        self.atol = 1e-12*np.abs(self.kernel).sum()
+        self.mask = np.zeros((w, h), dtype=bool)
+        self.field = np.zeros((w, h))
+
+
+    def update(self, believes):
+        """
+        Update the attraction field with the current believes' grid
+
+        Args:
+            believes (ndarray): believes' grid of the robot
+        """
+        mask = believes == 1
+        changed = np.argwhere(mask != self.mask)
+        if len(changed) > self.max_incremental:
+            self.field = np.fft.irfft2(np.fft.rfft2(mask.astype(float), s=self.fft_shape) * self.kernel_fft, s=self.fft_shape)[self.w-1:, self.h-1:].copy()
+        else: # Only add or remove the contribution of the few believes that changed
+            for a, b in changed:
+                contribution = self.kernel[self.w-1-a:2*self.w-1-a, self.h-1-b:2*self.h-1-b]
+                if mask[a, b]:
+                    self.field += contribution
+                else:
+                    self.field -= contribution
+        self.mask = mask
+
+
+    def score(self, x, y):
+        """ Weighted count of the cells with a belief of 1 around a cell """
+        return self.field[x, y] + self.center*self.mask[x, y]
+
+
+    def is_better(self, score, best_score, rtol=1e-9):
+        """ Whether a score is strictly better than the best one, scores closer than the precision of the field are considered equal """
+        return score > best_score + rtol*abs(best_score)
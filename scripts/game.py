@@ -7,52 +7,95 @@ __version__ = "1.0.0"
 
 import json, os
 import numpy as np
+from threading import Lock
 
 from my_constants import *
-from gui import GUI
+from belief import dilate
+from obstacles import ObstacleMap
 
 
 class Game:
     """ Handle the whole game """
-    def __init__(self, nb_agents, map_id):
+    def __init__(self, nb_agents, map_id, headless=False, fps=10):
         self.nb_agents = nb_agents
         self.nb_ready = 0
-        self.moves = [(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]
+        self.moves = MOVES
+        self.observers = []     #callbacks notified every time the state of the game changes
+        self.moves_lock = Lock()    #a batch of moves is applied without being interleaved with the moves of other clients
         self.load_map(map_id)
-        self.gui = GUI(self)
+        self.gui = None
+        if not headless:    #pygame is only imported when the game is rendered
+            from gui import GUI
+            self.gui = GUI(self, fps=fps)
+            self.subscribe(self.gui.on_state_change)
+
+
+    def subscribe(self, callback):
+        """ Register a callback called every time the state of the game changes """
+        self.observers.append(callback)
+
+
+    def notify(self):
+        """ Inform the observers that the state of the game changed """
+        for callback in self.observers:
+            callback()
 
     
     def load_map(self, map_id):
-        """ Load a map """
-        json_filename = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "config.json")
-        with open(json_filename, "r") as json_file:
-            self.map_cfg = json.load(json_file)[f"map_{map_id}"]        
+        """ Load a map: id of a map of the config file, or configuration of a generated map (see map_generator.py) """
+        if isinstance(map_id, dict):
+            self.map_cfg = map_id
+        else:
+            json_filename = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "config.json")
+            with open(json_filename, "r") as json_file:
+                self.map_cfg = json.load(json_file)[f"map_{map_id}"]        
         
+        self.entities = EntityStore(3*self.nb_agents)   #agents, keys and boxes are stored in the rows of this store
         self.agents, self.keys, self.boxes = [], [], []
         for i in range(self.nb_agents):
-            self.agents.append(Agent(i+1, self.map_cfg[f"agent_{i+1}"]["x"], self.map_cfg[f"agent_{i+1}"]["y"], self.map_cfg[f"agent_{i+1}"]["color"]))
-            self.keys.append(Key(self.map_cfg[f"key_{i+1}"]["x"], self.map_cfg[f"key_{i+1}"]["y"]))
-            self.boxes.append(Box(self.map_cfg[f"box_{i+1}"]["x"], self.map_cfg[f"box_{i+1}"]["y"]))
+            self.agents.append(Agent(i+1, self.map_cfg[f"agent_{i+1}"]["x"], self.map_cfg[f"agent_{i+1}"]["y"], self.map_cfg[f"agent_{i+1}"]["color"], self.entities))
+            self.keys.append(Key(self.map_cfg[f"key_{i+1}"]["x"], self.map_cfg[f"key_{i+1}"]["y"], self.entities, i))
+            self.boxes.append(Box(self.map_cfg[f"box_{i+1}"]["x"], self.map_cfg[f"box_{i+1}"]["y"], self.entities, i))
+        self.index_items()
         
         self.map_w, self.map_h = self.map_cfg["width"], self.map_cfg["height"]
-        self.map_real = np.zeros(shape=(self.map_h, self.map_w))
-        items = []
-        items.extend(self.keys)
-        items.extend(self.boxes)
-        offsets = [[(-1, -1), (0, -1), (1, -1), (-1, 0), (0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)], [(-2, -2), (-1, -2), (0, -2), (1, -2), (2, -2), (-2, -1), (2, -1), (-2, 0), (2, 0), (-2, 1), ( 2, 1), (-2, 2), (-1, 2), (0, 2), (1, 2), (2, 2)]]
-        for item in items:
-            for i, sub_list in enumerate(offsets):
-                for dx, dy in sub_list:
-                    if dx != 0 or dy != 0:
-                        self.add_val(item.x + dx, item.y + dy, item.neighbour_percent/(i+1))
-                    else:
-                        self.add_val(item.x, item.y, 1)
+        self.obstacles = ObstacleMap.from_config(self.map_cfg)     #cells that cannot be crossed
+        signal_cache = self.map_cfg.get("signal_cache")    #file caching the map_real field of a generated map
+        if signal_cache is not None and os.path.exists(signal_cache):
+            self.map_real = np.load(signal_cache)
+        else:
+            self.build_map_real()
+            if signal_cache is not None:
+                np.save(signal_cache, self.map_real)
 
-    
-    def add_val(self, x, y, val):
-        """ Add a value if x and y coordinates are in the range [map_w; map_h] """
-        if 0 <= x < self.map_w and 0 <= y < self.map_h:
-            self.map_real[y, x] = val
+
+    def index_items(self):
+        """ Index the items by position: (x, y) -> (owner, type). Must be called again if items are moved or removed """
+        self.item_index = {}
+        store = self.entities
+        for item_type in (BOX_TYPE, KEY_TYPE):  #a key is reported before a box located on the same cell
+            for i in store.of_type(item_type)[::-1]:    #and the item with the lowest owner before the others
+                self.item_index[(int(store.x[i]), int(store.y[i]))] = (int(store.owner[i]), item_type)
+
+
+    def build_map_real(self):
+        """ Build the field of the values perceived by the agents on every cell
+
+        Every item spreads its neighbour percentage on the cells one cell away and half of it on the cells two cells away.
+        When several values land on the same cell, the precedence rule is: an item is over any neighbour value, box \
+        values are over key values, and for the same type of item the value one cell away is over the value two cells away.
+        """
+        self.map_real = np.zeros(shape=(self.map_h, self.map_w))
+        centers = np.zeros(shape=(self.map_h, self.map_w), dtype=bool)
+        store = self.entities
+        for item_type, neighbour_percent in ((KEY_TYPE, KEY_NEIGHBOUR_PERCENTAGE), (BOX_TYPE, BOX_NEIGHBOUR_PERCENTAGE)):   #layers are painted from the lowest to the highest precedence
+            items = store.of_type(item_type)
+            mask = np.zeros(shape=(self.map_h, self.map_w), dtype=bool)
+            mask[store.y[items], store.x[items]] = True
+            self.map_real[dilate(mask, 2)] = neighbour_percent/2
+            self.map_real[dilate(mask, 1)] = neighbour_percent
+            centers |= mask
+        self.map_real[centers] = 1
 
 
     def process(self, msg, agent_id):
@@ -60,61 +103,194 @@ class Game:
         if msg["header"] == MOVE:
             return self.handle_move(msg, agent_id)
         elif msg["header"] == GET_DATA:
-            return {"sender": GAME_ID, "header": GET_DATA, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "w": self.map_w, "h": self.map_h, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x]}
+            reply = {"sender": GAME_ID, "header": GET_DATA, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "w": self.map_w, "h": self.map_h, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x]}
+            if msg.get("radius") is not None:   #occupancy of the cells around the agent (see ObstacleMap.patch)
+                reply["occupancy"] = self.obstacles.patch(self.agents[agent_id].x, self.agents[agent_id].y, msg["radius"])
+            return reply
         elif msg["header"] == GET_NB_CONNECTED_AGENTS:
             return {"sender": GAME_ID, "header": GET_NB_CONNECTED_AGENTS, "nb_connected_agents": self.nb_ready}
         elif msg["header"] == GET_NB_AGENTS:
             return {"sender": GAME_ID, "header": GET_NB_AGENTS, "nb_agents": self.nb_agents}
         elif msg["header"] == GET_ITEM_OWNER:
             return self.handle_item_owner_request(agent_id)
+        elif msg["header"] == STEP:
+            return self.handle_step(msg, agent_id)
         
 
-    def handle_move(self, msg, agent_id):
-        """ Make sure the desired move is allowed and update the agent's position """
-        if msg["direction"] in range(9):
-            dx, dy = self.moves[msg["direction"]]
+    def move_agent(self, agent_id, direction):
+        """ Make sure the desired move is allowed and update the agent's position, return whether the agent moved """
+        if direction in range(9):
+            dx, dy = self.moves[direction]
             x, y = self.agents[agent_id].x, self.agents[agent_id].y
-            if 0 <= x + dx < self.map_w and 0 <= y + dy < self.map_h:  
+            if 0 <= x + dx < self.map_w and 0 <= y + dy < self.map_h and not self.obstacles.blocked(x + dx, y + dy):
                 self.agents[agent_id].x, self.agents[agent_id].y = x + dx, y + dy
+                return True
+        return False
+
+
+    def handle_move(self, msg, agent_id):
+        """ Make sure the desired move is allowed and update the agent's position """
+        with self.moves_lock:
+            moved = self.move_agent(agent_id, msg["direction"])
+        if moved:
+            self.notify()
         return {"sender": GAME_ID, "header": MOVE, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x]}
 
 
+    def handle_step(self, msg, agent_id):
+        """ Apply a batch of moves in a single tick
+
+        msg["directions"] lists the moves, applied in order. msg["agents"] optionally gives the id of the agent of each move, \
+        all the moves are applied to the sender otherwise. The reply holds the position and cell value after each move.
+        The batch is checked before any move is applied: if it is invalid, no agent moves and the reply holds an "error".
+        """
+        agents = msg.get("agents", [agent_id]*len(msg["directions"]))
+        error = self.check_step(agents, msg["directions"])
+        if error is not None:
+            return {"sender": GAME_ID, "header": STEP, "agents": [], "x": [], "y": [], "cell_val": [], "error": error}
+        xs, ys, cell_vals = [], [], []
+        with self.moves_lock:
+            moved = False
+            for moved_id, direction in zip(agents, msg["directions"]):
+                moved |= self.move_agent(moved_id, direction)
+                x, y = self.agents[moved_id].x, self.agents[moved_id].y
+                xs.append(x)
+                ys.append(y)
+                cell_vals.append(float(self.map_real[y, x]))
+        if moved:   #observers only see the state at the end of the tick
+            self.notify()
+        return {"sender": GAME_ID, "header": STEP, "agents": list(agents), "x": xs, "y": ys, "cell_val": cell_vals}
+
+
+    def check_step(self, agents, directions):
+        """ Return why a batch of moves cannot be applied, None if it is valid """
+        if len(agents) != len(directions):
+            return f"{len(directions)} directions for {len(agents)} agents"
+        for moved_id in agents:
+            if not isinstance(moved_id, int) or moved_id not in range(self.nb_agents):
+                return f"Unknown agent: {moved_id!r}"
+        for direction in directions:
+            if not isinstance(direction, int) or direction not in range(9):
+                return f"Unknown direction: {direction!r}"
+        return None
+
+
     def handle_item_owner_request(self, agent_id):
-        if self.map_real[self.agents[agent_id].y, self.agents[agent_id].x] != 1.0:  #make sure the agent is located on an item
+        item = self.item_index.get((self.agents[agent_id].x, self.agents[agent_id].y))
+        if item is None:    #the agent is not located on an item
             return {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": None}
-        for i, key in enumerate(self.keys): #check if it's a key
-            if (self.agents[agent_id].x == key.x) and (self.agents[agent_id].y == key.y):
-                return  {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": i, "type": KEY_TYPE}
-        for i, box in enumerate(self.boxes):    #check if it's a box
-            if (self.agents[agent_id].x == box.x) and (self.agents[agent_id].y == box.y):
-                return  {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": i, "type": BOX_TYPE}
+        owner, item_type = item
+        return  {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": owner, "type": item_type}
+
 
+class EntityStore:
+    """ Structure-of-arrays storage of the entities of the game: one array per attribute, one row per entity """
+    AGENT_TYPE = -1     #type of the agents in the store (items use KEY_TYPE and BOX_TYPE)
 
-class Agent:
-    def __init__(self, id, x, y, color):
-        self.id = id
-        self.x, self.y = x, y
-        self.color = color
+    def __init__(self, capacity=8):
+        self.size = 0
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.owner = np.zeros(capacity, dtype=np.int32)    #id of an agent, owner of an item
+        self.type = np.zeros(capacity, dtype=np.int8)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+
+
+    def add(self, x, y, owner, type, color=(0, 0, 0)):
+        """ Add an entity and return its index """
+        if self.size == len(self.x):    #double the capacity of every array
+            for name in ("x", "y", "owner", "type", "color"):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate((array, np.zeros_like(array))))
+        i = self.size
+        self.x[i], self.y[i], self.owner[i], self.type[i], self.color[i] = x, y, owner, type, color
+        self.size += 1
+        return i
+
+
+    def sync(self, entities):
+        """ Copy the positions of some entities (e.g. the agents, after they moved) into the x and y arrays """
+        entities = list(entities)
+        indexes = [entity.index for entity in entities]
+        self.x[indexes] = [entity.x for entity in entities]
+        self.y[indexes] = [entity.y for entity in entities]
+
+
+    def of_type(self, type):
+        """ Indexes of the entities of a given type """
+        return np.flatnonzero(self.type[:self.size] == type)
+
+
+    def at(self, x, y, type=None):
+        """ Indexes of the entities located on a cell, optionally only those of a given type (the agents must be synced first) """
+        found = (self.x[:self.size] == x) & (self.y[:self.size] == y)
+        if type is not None:
+            found &= self.type[:self.size] == type
+        return np.flatnonzero(found)
+
+
+class Entity:
+    """ Entity stored in a row of an EntityStore
+
+    The position is kept in plain int attributes, read and written by the requests of the agents without going through \
+    numpy. The x and y arrays of the store are only updated by EntityStore.sync, before the queries on every entity.
+    """
+    __slots__ = ("store", "index", "x", "y")
+
+    def __init__(self, store, index):
+        self.store, self.index = store, index
+        self.x, self.y = int(store.x[index]), int(store.y[index])
+
+
+class Agent(Entity):
+    __slots__ = ()
+
+    def __init__(self, id, x, y, color, store=None):
+        store = store if store is not None else EntityStore(1)
+        Entity.__init__(self, store, store.add(x, y, id, EntityStore.AGENT_TYPE, color))
+
+    @property
+    def id(self):
+        return int(self.store.owner[self.index])
+
+    @property
+    def color(self):
+        return tuple(int(c) for c in self.store.color[self.index])
 
     def __repr__(self):
         return f"Agent's id: {self.id}, x: {self.x}, y: {self.y}, color: {self.color}"
     
 
-class Item:
-    def __init__(self, x, y, neighbor_percent, type):
-        self.x, self.y = x, y
+class Item(Entity):
+    __slots__ = ("neighbour_percent",)
+    TYPES = {"key": KEY_TYPE, "box": BOX_TYPE}
+
+    def __init__(self, x, y, neighbor_percent, type, store=None, owner=-1):
+        store = store if store is not None else EntityStore(1)
+        Entity.__init__(self, store, store.add(x, y, owner, self.TYPES[type]))
         self.neighbour_percent = neighbor_percent
-        self.type = type
+
+    @property
+    def type(self):
+        return "key" if self.store.type[self.index] == KEY_TYPE else "box"
+
+    @property
+    def owner(self):
+        return int(self.store.owner[self.index])
 
     def __repr__(self):
         return f"type: {self.type}, x: {self.x}, y: {self.y}"
 
 
 class Key(Item):
-    def __init__(self, x, y):
-        Item.__init__(self, x, y, KEY_NEIGHBOUR_PERCENTAGE, "key")
+    __slots__ = ()
+
+    def __init__(self, x, y, store=None, owner=-1):
+        Item.__init__(self, x, y, KEY_NEIGHBOUR_PERCENTAGE, "key", store, owner)
     
 
 class Box(Item):
-    def __init__(self, x, y):
-        Item.__init__(self, x, y, BOX_NEIGHBOUR_PERCENTAGE, "box")
\ No newline at end of file
+    __slots__ = ()
+
+    def __init__(self, x, y, store=None, owner=-1):
+        Item.__init__(self, x, y, BOX_NEIGHBOUR_PERCENTAGE, "box", store, owner)
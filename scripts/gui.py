@@ -8,20 +8,35 @@ import pygame, os
 from my_constants import *    
 
 img_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "img")
+IDLE_TIMEOUT = 100  #ms, longest wait for an event when the frame rate is not limited
 
 
 class GUI:
     def __init__(self, game, fps=10, cell_size=40):
+        """ cell_size is the largest size of a cell in pixels, it is reduced if the map does not fit on the screen """
         self.game = game
         self.w, self.h = self.game.map_w, self.game.map_h
         self.fps = fps
         self.clock = pygame.time.Clock()
         self.cell_size = cell_size
         self.screen_res = (self.w*cell_size, self.h*cell_size)      
+        self.dirty = True   #the game changed since the last frame
+        self.full_redraw = True     #the whole window has to be drawn, otherwise only the cells the agents left or entered
+        self.agent_cells = []   #cells where the agents were drawn on the last frame
+        self.running = False
+        self.redraw_event = pygame.event.custom_type()   #wakes up the render loop when it waits for an event
+
+
+    def on_state_change(self):
+        if not self.dirty:
+            self.dirty = True
+            if self.fps == 0 and self.running:  #the render loop may be blocked in pygame.event.wait
+                pygame.event.post(pygame.event.Event(self.redraw_event))
 
 
     def on_init(self):
         pygame.init()
+        self.fit_to_screen()
         self.screen = pygame.display.set_mode(self.screen_res)
         pygame.display.set_icon(pygame.image.load(img_folder + "/icon.png"))
         pygame.display.set_caption("IN512 Project")
@@ -29,6 +44,14 @@ class GUI:
         self.running = True
 
 
+    def fit_to_screen(self, margin=0.9):
+        """ Reduce the size of the cells so that the window takes at most a fraction (margin) of the screen """
+        info = pygame.display.Info()
+        if info.current_w > 0 and info.current_h > 0:  #the size of the screen is unknown on some platforms
+            self.cell_size = max(1, min(self.cell_size, int(info.current_w*margin)//self.w, int(info.current_h*margin)//self.h))
+        self.screen_res = (self.w*self.cell_size, self.h*self.cell_size)
+
+
     def create_items(self):
         #box
         box_img = pygame.image.load(img_folder + "/box.png")
@@ -39,17 +62,48 @@ class GUI:
         key_img = pygame.transform.scale(key_img, (self.cell_size, self.cell_size))
         self.keys = [key_img.copy() for _ in range(self.game.nb_agents)]
         #agent text number
-        font = pygame.font.SysFont("Arial", self.cell_size//4, True)
+        font = pygame.font.SysFont("Arial", max(self.cell_size//4, 1), True)
         self.text_agents = [font.render(f"{i+1}", True, self.game.agents[i].color) for i in range(self.game.nb_agents)]
         #agent_img
         agent_img = pygame.image.load(img_folder + "/robot.png")
         agent_img = pygame.transform.scale(agent_img, (self.cell_size, self.cell_size))
         self.agents = [agent_img.copy() for _ in range(self.game.nb_agents)]
+        #static layer: grid, obstacles, keys and boxes are drawn once
+        self.background = pygame.Surface(self.screen_res)
+        self.draw_background(self.background)
+
+
+    def draw_background(self, surface):
+        surface.fill(BG_COLOR)
+
+        #Grid
+        if self.cell_size >= 4: #lines would hide the cells of smaller sizes
+            for i in range(1, self.h):
+                pygame.draw.line(surface, BLACK, (0, i*self.cell_size), (self.w*self.cell_size, i*self.cell_size))
+            for j in range(1, self.w):
+                pygame.draw.line(surface, BLACK, (j*self.cell_size, 0), (j*self.cell_size, self.h*self.cell_size))
+
+        #Obstacles
+        rows, columns = self.game.obstacles.mask().nonzero()
+        for y, x in zip(rows, columns):
+            pygame.draw.rect(surface, WALL_COLOR, (x*self.cell_size, y*self.cell_size, self.cell_size, self.cell_size))
+
+        for i in range(self.game.nb_agents):
+            #keys
+            pygame.draw.rect(surface, self.game.agents[i].color, (self.game.keys[i].x*self.cell_size, self.game.keys[i].y*self.cell_size, self.cell_size, self.cell_size), width=3)
+            surface.blit(self.keys[i], self.keys[i].get_rect(topleft=(self.game.keys[i].x*self.cell_size, self.game.keys[i].y*self.cell_size)))
+            
+            #boxes
+            pygame.draw.rect(surface, self.game.agents[i].color, (self.game.boxes[i].x*self.cell_size, self.game.boxes[i].y*self.cell_size, self.cell_size, self.cell_size), width=3)
+            surface.blit(self.boxes[i], self.boxes[i].get_rect(topleft=(self.game.boxes[i].x*self.cell_size, self.game.boxes[i].y*self.cell_size)))
 
     
     def on_event(self, event):
         if event.type == pygame.QUIT:
             self.running = False
+        elif event.type == pygame.VIDEOEXPOSE:  #the window has to be redrawn
+            self.dirty = True
+            self.full_redraw = True
 
     
     def on_cleanup(self):
@@ -63,33 +117,40 @@ class GUI:
             while self.running:
                 for event in pygame.event.get():
                     self.on_event(event)    
-                self.draw()
-                self.clock.tick(self.fps)
+                if self.dirty:  #only redraw when the game changed
+                    self.dirty = False
+                    self.draw()
+                if self.fps > 0:
+                    self.clock.tick(self.fps)
+                elif not self.dirty:    #no frame rate: sleep until the game changes or a window event comes
+                    self.on_event(pygame.event.wait(IDLE_TIMEOUT))
             self.on_cleanup()
         except Exception:
             pass
     
 
     def draw(self):
-        self.screen.fill(BG_COLOR)
+        cells = [(agent.x, agent.y) for agent in self.game.agents]
+        full_redraw, self.full_redraw = self.full_redraw, False
+        if full_redraw:
+            self.screen.blit(self.background, (0, 0))
+            dirty_cells = set(cells)
+        else:   #only the cells the agents left or entered
+            dirty_cells = {cell for old, new in zip(self.agent_cells, cells) if old != new for cell in (old, new)}
+        self.agent_cells = cells
 
-        #Grid
-        for i in range(1, self.h):
-            pygame.draw.line(self.screen, BLACK, (0, i*self.cell_size), (self.w*self.cell_size, i*self.cell_size))
-        for j in range(1, self.w):
-            pygame.draw.line(self.screen, BLACK, (j*self.cell_size, 0), (j*self.cell_size, self.h*self.cell_size))
+        rects = []
+        for x, y in dirty_cells:    #restore the static layer
+            rect = pygame.Rect(x*self.cell_size, y*self.cell_size, self.cell_size, self.cell_size)
+            self.screen.blit(self.background, rect, rect)
+            rects.append(rect)
 
-        for i in range(self.game.nb_agents):            
-            #keys
-            pygame.draw.rect(self.screen, self.game.agents[i].color, (self.game.keys[i].x*self.cell_size, self.game.keys[i].y*self.cell_size, self.cell_size, self.cell_size), width=3)
-            self.screen.blit(self.keys[i], self.keys[i].get_rect(topleft=(self.game.keys[i].x*self.cell_size, self.game.keys[i].y*self.cell_size)))
-            
-            #boxes
-            pygame.draw.rect(self.screen, self.game.agents[i].color, (self.game.boxes[i].x*self.cell_size, self.game.boxes[i].y*self.cell_size, self.cell_size, self.cell_size), width=3)
-            self.screen.blit(self.boxes[i], self.boxes[i].get_rect(topleft=(self.game.boxes[i].x*self.cell_size, self.game.boxes[i].y*self.cell_size)))
-            
-            #agents
-            self.screen.blit(self.agents[i], self.agents[i].get_rect(center=(self.game.agents[i].x*self.cell_size + self.cell_size//2, self.game.agents[i].y*self.cell_size + self.cell_size//2)))
-            self.screen.blit(self.text_agents[i], self.text_agents[i].get_rect(center=(self.game.agents[i].x*self.cell_size + self.cell_size-self.text_agents[i].get_width()//2, self.game.agents[i].y*self.cell_size + self.cell_size-self.text_agents[i].get_height()//2)))
+        for i, (x, y) in enumerate(cells):
+            if (x, y) in dirty_cells:   #agents on a restored cell, the other ones are still on the screen
+                self.screen.blit(self.agents[i], self.agents[i].get_rect(center=(x*self.cell_size + self.cell_size//2, y*self.cell_size + self.cell_size//2)))
+                self.screen.blit(self.text_agents[i], self.text_agents[i].get_rect(bottomright=(x*self.cell_size + self.cell_size, y*self.cell_size + self.cell_size)))   #kept inside the cell
         
-        pygame.display.update()
\ No newline at end of file
+        if full_redraw:
+            pygame.display.update()
+        else:
+            pygame.display.update(rects)
@@ -0,0 +1,108 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Procedural maps: arbitrary sizes and numbers of agents, reproducible from a seed and cached on disk """
+
+import json, os
+import numpy as np
+
+from obstacles import ObstacleMap
+from planner import distance_field
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "cache")
+AGENT_COLORS = [[255, 0, 0], [0, 0, 255], [127, 200, 0], [200, 127, 0]]   #colors of the maps of the config file
+CACHE_VERSION = 4   #part of the names of the cached files, increased every time the generated maps or their map_real field change
+
+
+def generate_map(width, height, nb_agents, seed=0, obstacle_density=0.0):
+    """
+    Generate the configuration of a map with the same layout as the maps of the config file
+
+    Args:
+        width (int): width of the map
+        height (int): height of the map
+        nb_agents (int): number of agents (each agent has a key and a box)
+        seed (int, optional): seed of the generator. Defaults to 0.
+        obstacle_density (float, optional): probability of a cell to be an obstacle. Defaults to 0.0.
+
+    Returns:
+        dict: configuration of the map
+    """
+    if 3*nb_agents > width*height:
+        raise ValueError(f"A {width}x{height} map is too small for {nb_agents} agents")
+    rng = np.random.default_rng(seed)
+    map_cfg = {"width": width, "height": height}
+    free = np.arange(width*height)
+    if obstacle_density > 0:
+        walls = rng.random((height, width)) < obstacle_density
+        # Only keep the free cells connected to a random free cell: every entity can reach every other one
+        start = divmod(int(rng.choice(np.flatnonzero(~walls))), width)[::-1]
+        walls |= np.isinf(distance_field(start, width, height, walls.T)).T
+        free = np.flatnonzero(~walls)
+        if 3*nb_agents > len(free):
+            raise ValueError(f"Not enough free cells in a {width}x{height} map with a density of {obstacle_density} for {nb_agents} agents")
+        map_cfg["obstacles"] = ObstacleMap.from_mask(walls).to_string()
+    cells = free[rng.choice(len(free), size=3*nb_agents, replace=False)]    #agents, keys and boxes are on different cells
+    for i in range(nb_agents):
+        for j, entity in enumerate(["agent", "key", "box"]):
+            y, x = divmod(int(cells[3*i + j]), width)
+            map_cfg[f"{entity}_{i+1}"] = {"x": x, "y": y}
+        map_cfg[f"agent_{i+1}"]["color"] = AGENT_COLORS[i] if i < len(AGENT_COLORS) else [int(c) for c in rng.integers(0, 256, 3)]
+    return map_cfg
+
+
+def load_generated_map(width, height, nb_agents, seed=0, obstacle_density=0.0, cache_dir=CACHE_DIR):
+    """
+    Load a generated map from the cache, generate and cache it if needed
+
+    Args:
+        width (int): width of the map
+        height (int): height of the map
+        nb_agents (int): number of agents
+        seed (int, optional): seed of the generator. Defaults to 0.
+        obstacle_density (float, optional): probability of a cell to be an obstacle. Defaults to 0.0.
+        cache_dir (str, optional): folder of the cache. Defaults to CACHE_DIR.
+
+    Returns:
+        dict: configuration of the map, its "signal_cache" entry is the file where Game caches the map_real field
+    """
+    name = f"map_v{CACHE_VERSION}_{width}x{height}_{nb_agents}_{seed}" + (f"_{obstacle_density}" if obstacle_density > 0 else "")
+    json_filename = os.path.join(cache_dir, name + ".json")
+    if os.path.exists(json_filename):
+        with open(json_filename, "r") as json_file:
+            map_cfg = json.load(json_file)
+    else:
+        map_cfg = generate_map(width, height, nb_agents, seed, obstacle_density)
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(json_filename, "w") as json_file:
+            json.dump(map_cfg, json_file)
+    map_cfg["signal_cache"] = os.path.join(cache_dir, name + ".npy")
+    return map_cfg
+
+
+def is_generated(map_id):
+    """ Whether a map identifier is the size of a generated map ("200x100") rather than the id of a map of the config file """
+    return isinstance(map_id, str) and "x" in map_id
+
+
+def resolve_map(map_id, nb_agents, seed=0, obstacle_density=0.0):
+    """
+    Convert a map identifier into what Game.load_map expects
+
+    Args:
+        map_id (int or str): id of a map of the config file (1, "2"...) or size of a generated map ("200x100")
+        nb_agents (int): number of agents
+        seed (int, optional): seed of a generated map. Defaults to 0.
+        obstacle_density (float, optional): probability of a cell of a generated map to be an obstacle. Defaults to 0.0.
+
+    Returns:
+        int or dict: id of the map of the config file, or configuration of the generated map
+    """
+    if is_generated(map_id):
+        width, height = (int(size) for size in map_id.split("x"))
+        return load_generated_map(width, height, nb_agents, seed, obstacle_density)
+    return int(map_id)
@@ -0,0 +1,148 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Instrumentation of the server: message counts, latencies of the game, send queues, broadcasts and errors
+
+The server only records metrics when it is given a Metrics instance, the instrumentation costs a test otherwise.
+Latencies are kept in histograms with power of two buckets: bucket i counts the durations of less than 2**i microseconds
+(and at least 2**(i-1) microseconds), so recording a duration is a constant-time operation.
+"""
+
+import json, os, time
+from collections import Counter
+from threading import Thread, Lock, Event
+
+
+NB_BUCKETS = 32     #the last bucket counts every duration of more than 2**30 microseconds
+
+
+class Histogram:
+    """ Histogram of durations with power of two buckets """
+    def __init__(self):
+        self.buckets = [0]*NB_BUCKETS
+        self.count = 0
+        self.total = 0.0    #seconds
+        self.max = 0.0
+
+
+    def add(self, seconds):
+        self.buckets[min(int(seconds*1e6).bit_length(), NB_BUCKETS-1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+    def quantile(self, q):
+        """ Upper bound (in microseconds) of the bucket holding the q-quantile """
+        rank, seen = q*self.count, 0
+        for i, nb in enumerate(self.buckets):
+            seen += nb
+            if nb and seen >= rank:
+                return 2**i
+        return 0
+
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total/self.count*1e6 if self.count else 0,
+            "max_us": self.max*1e6,
+            "p50_us": self.quantile(0.5),
+            "p99_us": self.quantile(0.99),
+            "histogram_us": {f"<{2**i}": nb for i, nb in enumerate(self.buckets) if nb},
+        }
+
+
+class Metrics:
+    """ Metrics of a server, shared by the threads of the clients """
+    def __init__(self, dump_path=None, dump_interval=5.0):
+        """
+        Args:
+            dump_path (str, optional): JSON file where the metrics are written periodically, not written if None. Defaults to None.
+            dump_interval (float, optional): seconds between two dumps. Defaults to 5.0.
+        """
+        self.lock = Lock()
+        self.start_time = time.time()
+        self.messages = Counter()   #header -> number of messages received
+        self.latencies = {}     #header -> Histogram of Game.process
+        self.broadcasts = Histogram()   #time spent in send_to_all
+        self.fanout = 0     #number of frames sent by send_to_all
+        self.dropped = 0    #number of broadcast frames dropped because the queue of the client was full
+        self.queue_depths = {}  #client id -> [current, max] number of frames waiting to be sent
+        self.errors = Counter()     #type of exception -> number of clients closed by it
+        self.last_error = None
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.closed = Event()
+        if dump_path is not None:
+            Thread(target=self.dump_cb, daemon=True).start()
+
+
+    def record_message(self, header):
+        with self.lock:
+            self.messages[header] += 1
+
+
+    def record_process(self, header, seconds):
+        with self.lock:
+            if header not in self.latencies:
+                self.latencies[header] = Histogram()
+            self.latencies[header].add(seconds)
+
+
+    def record_broadcast(self, seconds, fanout, dropped=0):
+        with self.lock:
+            self.broadcasts.add(seconds)
+            self.fanout += fanout
+            self.dropped += dropped
+
+
+    def record_queue_depth(self, client_id, depth):
+        with self.lock:
+            depths = self.queue_depths.setdefault(client_id, [0, 0])
+            depths[0] = depth
+            depths[1] = max(depths[1], depth)
+
+
+    def record_error(self, error):
+        with self.lock:
+            self.errors[type(error).__name__] += 1
+            self.last_error = repr(error)
+
+
+    def snapshot(self):
+        """ Current metrics as a JSON serializable dict """
+        with self.lock:
+            return {
+                "uptime": time.time() - self.start_time,
+                "messages": {str(header): nb for header, nb in self.messages.items()},
+                "process": {str(header): histogram.summary() for header, histogram in self.latencies.items()},
+                "broadcasts": dict(self.broadcasts.summary(), fanout=self.fanout, dropped=self.dropped),
+                "queue_depths": {str(client_id): {"current": current, "max": maximum} for client_id, (current, maximum) in self.queue_depths.items()},
+                "errors": dict(self.errors),
+                "last_error": self.last_error,
+            }
+
+
+    def dump(self):
+        """ Write the metrics to the dump file (replaced atomically) """
+        tmp_path = self.dump_path + ".tmp"
+        with open(tmp_path, "w") as dump_file:
+            json.dump(self.snapshot(), dump_file, indent=1)
+        os.replace(tmp_path, self.dump_path)
+
+
+    def dump_cb(self):
+        """ Dump the metrics periodically (background thread) """
+        while not self.closed.wait(self.dump_interval):
+            self.dump()
+
+
+    def close(self):
+        """ Stop the periodic dump and write the final metrics """
+        self.closed.set()
+        if self.dump_path is not None:
+            self.dump()
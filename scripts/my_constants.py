@@ -8,11 +8,14 @@ __version__ = "1.0.0"
 
 """ MSG HEADERS """
 BROADCAST_MSG = 0
-GET_DATA = 1    #get the current location of the agent and the dimension of the environment (width and height)
+GET_DATA = 1    #get the current location of the agent and the dimension of the environment (width and height), and the obstacles around the agent if a "radius" is given
 MOVE = 2
 GET_NB_CONNECTED_AGENTS = 3
 GET_NB_AGENTS = 4
 GET_ITEM_OWNER = 5
+STEP = 6    #apply several moves in a single request (a planned path, or the moves of several agents controlled by one process)
+GET_STATS = 7   #get the metrics of the server (None if the server does not record them)
+SUBSCRIBE = 8   #only receive the broadcasts of some types ("types") and/or about the items of some agents ("owners")
 
 """ ALLOWED MOVES """
 STAND = 0   #do not move
@@ -24,6 +27,7 @@ UP_LEFT = 5
 UP_RIGHT = 6
 DOWN_LEFT = 7
 DOWN_RIGHT = 8
+MOVES = [(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]   #(dx, dy) of each move
 
 """ BROADCAST TYPES """
 KEY_DISCOVERED = 1  #inform other agents that you discovered a key
@@ -41,4 +45,5 @@ BOX_TYPE = 1
 BG_COLOR = (255, 255, 255)
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
-RED = (255, 0, 0)
\ No newline at end of file
+RED = (255, 0, 0)
+WALL_COLOR = (90, 90, 90)
\ No newline at end of file
@@ -4,28 +4,111 @@ __credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
 __license__ = "Apache License 2.0"
 __version__ = "1.0.0"
 
-import socket, pickle
+import socket
+from queue import Queue, Empty
+from threading import Thread, Lock
+from protocol import encode, Decoder
+from my_constants import *
+
+
+CLOSED = object()   #put in the queues when the connection is closed
 
 
 class Network:
-    """ Class that is used by the agent to communicate with the server """
+    """ Class that is used by the agent to communicate with the server
+
+    A background thread reads the socket and sorts the incoming messages: the server answers the requests of a client in \
+    the order they were sent, so the replies are queued in that order and matched to the requests, while the messages \
+    broadcast by the other agents are queued separately.
+    """
     def __init__(self, server_ip="localhost"):
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.conf = (server_ip, 5555)
+        self.decoder = Decoder()
+        self.replies = Queue()      #replies of the game to the requests of this client
+        self.broadcasts = Queue()   #messages broadcast by the other agents
+        self.request_lock = Lock()  #a request and its reply are not interleaved with the request of another thread
         self.id = self.connect()
+        Thread(target=self.receive_cb, daemon=True).start()
 
     def connect(self):
         try:
             self.client.connect(self.conf)
-            return pickle.loads(self.client.recv(1024))
+            messages = []
+            while not messages:     #the id of the client is the first message of the server
+                data = self.client.recv(65536)
+                if not data:
+                    raise ConnectionError("Connection closed by the server")
+                messages = self.decoder.feed(data)
+            for msg in messages[1:]:
+                self.dispatch(msg)
+            return messages[0]
         except Exception as e:
             raise
-    
+
+    def receive_cb(self):
+        """ Read the socket and dispatch the messages (background thread) """
+        try:
+            while True:
+                data = self.client.recv(65536)
+                if not data:
+                    break
+                for msg in self.decoder.feed(data):
+                    self.dispatch(msg)
+        except OSError:
+            pass
+        self.replies.put(CLOSED)
+        self.broadcasts.put(CLOSED)
+
+    def dispatch(self, msg):
+        if isinstance(msg, dict) and msg.get("header") == BROADCAST_MSG:
+            self.broadcasts.put(msg)
+        else:
+            self.replies.put(msg)
+
     def send(self, data):
         try:
-            self.client.sendall(pickle.dumps(data))
+            self.client.sendall(encode(data))
         except Exception as e:
             print(e)
-    
-    def receive(self):
-        return pickle.loads(self.client.recv(1024))
\ No newline at end of file
+
+    def send_many(self, messages):
+        """ Pipeline several messages in a single write, the replies are received in the same order """
+        try:
+            self.client.sendall(b"".join(encode(data) for data in messages))
+        except Exception as e:
+            print(e)
+
+    def request(self, data, timeout=None):
+        """ Send a request and wait for its reply """
+        with self.request_lock:
+            self.send(data)
+            return self.receive(timeout)
+
+    def request_many(self, messages, timeout=None):
+        """ Pipeline several requests and wait for their replies, returned in the same order """
+        with self.request_lock:
+            self.send_many(messages)
+            return [self.receive(timeout) for _ in messages]
+
+    def receive(self, timeout=None):
+        """ Next reply of the game """
+        try:
+            msg = self.replies.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError("No reply from the server") from None
+        if msg is CLOSED:
+            self.replies.put(CLOSED)
+            raise ConnectionError("Connection closed by the server")
+        return msg
+
+    def receive_broadcast(self, timeout=None):
+        """ Next message broadcast by another agent, None if there is none after timeout seconds (0 to not wait) """
+        try:
+            msg = self.broadcasts.get(block=timeout != 0, timeout=timeout or None)
+        except Empty:
+            return None
+        if msg is CLOSED:
+            self.broadcasts.put(CLOSED)
+            raise ConnectionError("Connection closed by the server")
+        return msg
@@ -0,0 +1,93 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Obstacle layer of the maps: the cells that cannot be crossed, one bit per cell
+
+In a map configuration, the optional "obstacles" entry is the bitmap encoded in base64: the rows of the map one after
+the other (cell (x, y) is bit y*width + x), 8 cells per byte, the first cell in the most significant bit.
+A 1000x1000 map takes 125 kB.
+"""
+
+import base64
+import numpy as np
+
+
+class ObstacleMap:
+    """ Bitmap of the cells that cannot be crossed """
+    def __init__(self, w, h, bits=None):
+        """
+        Args:
+            w (int): width of the map
+            h (int): height of the map
+            bits (bytes, optional): packed bitmap, no obstacle if None. Defaults to None.
+        """
+        self.w, self.h = w, h
+        self.bits = bytearray(bits) if bits is not None else bytearray((w*h + 7)//8)
+        if len(self.bits) != (w*h + 7)//8:
+            raise ValueError(f"The bitmap does not match a {w}x{h} map")
+
+
+    @classmethod
+    def from_mask(cls, mask):
+        """ Bitmap of a (h, w) boolean array (True for the obstacles) """
+        h, w = mask.shape
+        return cls(w, h, np.packbits(mask.ravel()).tobytes())
+
+
+    @classmethod
+    def from_string(cls, data, w, h):
+        """ Bitmap encoded by to_string """
+        return cls(w, h, base64.b64decode(data))
+
+
+    @classmethod
+    def from_config(cls, map_cfg):
+        """ Obstacles of a map configuration (no obstacle if it has no "obstacles" entry) """
+        data = map_cfg.get("obstacles")
+        if data is None:
+            return cls(map_cfg["width"], map_cfg["height"])
+        return cls.from_string(data, map_cfg["width"], map_cfg["height"])
+
+
+    def to_string(self):
+        return base64.b64encode(bytes(self.bits)).decode("ascii")
+
+
+    def blocked(self, x, y):
+        """ Whether the cell (x, y) is an obstacle """
+        i = y*self.w + x
+        return (self.bits[i >> 3] >> (7 - (i & 7))) & 1 == 1
+
+
+    def mask(self):
+        """ (h, w) boolean array of the obstacles """
+        return np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8), count=self.w*self.h).reshape(self.h, self.w).astype(bool)
+
+
+    def patch(self, x, y, radius):
+        """
+        Occupancy of the cells around a position
+
+        Args:
+            x (int): x-position of the center
+            y (int): y-position of the center
+            radius (int): the patch holds the cells at most radius cells away (clipped to the map)
+
+        Returns:
+            dict: "x" and "y" of the top left cell of the patch, its "w" and "h" and its "bitmap" (same encoding as the map)
+        """
+        x0, x1 = max(x-radius, 0), min(x+radius+1, self.w)
+        y0, y1 = max(y-radius, 0), min(y+radius+1, self.h)
+        # Only the bytes of the rows of the patch are unpacked
+        start, stop = y0*self.w, y1*self.w
+        rows = np.unpackbits(np.frombuffer(bytes(self.bits[start >> 3:(stop + 7) >> 3]), dtype=np.uint8))
+        rows = rows[start & 7:(start & 7) + stop - start].reshape(y1-y0, self.w)
+        return {"x": x0, "y": y0, "w": x1-x0, "h": y1-y0, "bitmap": ObstacleMap.from_mask(rows[:, x0:x1].astype(bool)).to_string()}
+
+
+    def count(self):
+        """ Number of obstacles """
+        return int(np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8)).sum())
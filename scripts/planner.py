@@ -0,0 +1,94 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Path planning towards a known target with distance fields
+
+The distance field of a target gives the number of moves (8-connected) needed to reach it from every cell. It is computed
+once per target and cached until the obstacles change, so choosing the next move is a lookup in the 3x3 window of the robot.
+"""
+
+import numpy as np
+
+from belief import window, dilate
+
+
+def distance_field(target, w, h, obstacles=None):
+    """
+    Number of moves needed to reach a target from every cell of the map
+
+    Args:
+        target (tuple): position of the target
+        w (int): width of the map
+        h (int): height of the map
+        obstacles (ndarray, optional): (w, h) boolean array of the cells that cannot be crossed. Defaults to None.
+
+    Returns:
+        ndarray: (w, h) array of the distances, inf for the obstacles and the cells that cannot reach the target
+    """
+    if obstacles is None or not obstacles.any():    #Chebyshev distance on an empty map
+        xs, ys = np.ogrid[:w, :h]
+        return np.maximum(np.abs(xs - target[0]), np.abs(ys - target[1])).astype(float)
+
+    # Breadth-first search, one layer of cells at a time
+    free = ~obstacles
+    field = np.full((w, h), np.inf)
+    reached = np.zeros((w, h), dtype=bool)
+    reached[target[0], target[1]] = True
+    frontier, distance = reached.copy(), 0
+    while frontier.any():
+        field[frontier] = distance
+        frontier = dilate(frontier, 1) & free & ~reached
+        reached |= frontier
+        distance += 1
+    return field
+
+
+class Planner:
+    """ Choose the moves towards a target, the distance field of every target is cached """
+    def __init__(self, w, h, obstacles=None):
+        """
+        Args:
+            w (int): width of the map
+            h (int): height of the map
+            obstacles (ndarray, optional): (w, h) boolean array of the cells that cannot be crossed. Defaults to None.
+        """
+        self.w, self.h = w, h
+        self.obstacles = obstacles
+        self.fields = {}    #target -> distance field
+
+
+    def set_obstacles(self, obstacles):
+        """ Change the cells that cannot be crossed, the cached distance fields are dropped """
+        self.obstacles = obstacles
+        self.fields.clear()
+
+
+    def field(self, target):
+        target = tuple(target)
+        if target not in self.fields:
+            self.fields[target] = distance_field(target, self.w, self.h, self.obstacles)
+        return self.fields[target]
+
+
+    def next_cell(self, x, y, target):
+        """
+        Choose the next cell to go towards a target
+
+        Args:
+            x (int): x-position of the robot
+            y (int): y-position of the robot
+            target (tuple): position of the target
+
+        Returns:
+            tuple: the cell of the 3x3 window of the robot (the current cell included) that is the closest to the target. \
+                Ties are broken by the euclidean distance to the target, then in favour of the first cell (column by column).
+        """
+        xs, ys = window(x, y, 1, self.w, self.h)
+        distances = self.field(target)[xs, ys]
+        euclidean = np.hypot(np.arange(xs.start, xs.stop)[:, None] - target[0], np.arange(ys.start, ys.stop)[None, :] - target[1])
+        best = np.lexsort((euclidean.ravel(), distances.ravel()))[0]    #stable sort: the first cell wins the remaining ties
+        i, j = divmod(int(best), ys.stop - ys.start)
+        return xs.start + i, ys.start + j
@@ -0,0 +1,165 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" This file contains the wire protocol shared by the server and the agents
+
+Every message is sent as a frame: a 4-byte big-endian payload length followed by the payload.
+The first byte of the payload tells how the message is encoded: the hot MOVE/GET_DATA/STEP messages use a
+struct layout, any other message falls back to pickle.
+"""
+
+import pickle, struct
+from my_constants import *
+
+
+LENGTH = struct.Struct("!I")
+
+""" PAYLOAD TAGS """
+PICKLE_TAG = 0
+MOVE_REQUEST_TAG = 1
+MOVE_REPLY_TAG = 2
+GET_DATA_REPLY_TAG = 3
+STEP_REQUEST_TAG = 4
+STEP_AGENTS_REQUEST_TAG = 5
+STEP_REPLY_TAG = 6
+
+# Fixed layouts: (tag, header, keys of the message in order, struct of the values, whether the message comes from the game)
+LAYOUTS = [
+    (MOVE_REQUEST_TAG, MOVE, ("header", "direction"), struct.Struct("!B"), False),
+    (MOVE_REPLY_TAG, MOVE, ("sender", "header", "x", "y", "cell_val"), struct.Struct("!iid"), True),
+    (GET_DATA_REPLY_TAG, GET_DATA, ("sender", "header", "x", "y", "w", "h", "cell_val"), struct.Struct("!iiiid"), True),
+]
+# Array layouts: same as above, but every value is a list of the same length and the struct gives the type of each list
+ARRAY_LAYOUTS = [
+    (STEP_REQUEST_TAG, STEP, ("header", "directions"), "B", False),
+    (STEP_AGENTS_REQUEST_TAG, STEP, ("header", "directions", "agents"), "Bi", False),
+    (STEP_REPLY_TAG, STEP, ("sender", "header", "agents", "x", "y", "cell_val"), "iiid", True),
+]
+LAYOUT_BY_TAG = {layout[0]: layout for layout in LAYOUTS + ARRAY_LAYOUTS}
+COUNT = struct.Struct("!I")
+
+
+def _struct_layout(msg, layouts):
+    """ Return the layout that can encode a message, None if it has to be pickled """
+    if not isinstance(msg, dict):
+        return None
+    for layout in layouts:
+        tag, header, keys, fmt, from_game = layout
+        if msg.get("header") == header and tuple(msg) == keys and (not from_game or msg["sender"] == GAME_ID):
+            return layout
+    return None
+
+
+def _pack_arrays(tag, fmt, arrays):
+    """ Payload of an array layout: the length of the lists followed by each list """
+    n = len(arrays[0])
+    if any(len(values) != n for values in arrays):
+        return None
+    return bytes([tag]) + COUNT.pack(n) + b"".join(struct.pack(f"!{n}{code}", *values) for code, values in zip(fmt, arrays))
+
+
+def _unpack_arrays(fmt, payload):
+    """ Lists of an array layout payload (without its tag) """
+    n = COUNT.unpack_from(payload)[0]
+    offset, arrays = COUNT.size, []
+    for code in fmt:
+        array = struct.Struct(f"!{n}{code}")
+        arrays.append(list(array.unpack_from(payload, offset)))
+        offset += array.size
+    return arrays
+
+
+def encode(msg):
+    """
+    Encode a message into a frame
+
+    Args:
+        msg: message to send (usually a dict)
+
+    Returns:
+        bytes: the frame (length prefix + payload)
+    """
+    payload = None
+    try:
+        layout = _struct_layout(msg, LAYOUTS)
+        if layout is not None:
+            tag, header, keys, fmt, from_game = layout
+            payload = bytes([tag]) + fmt.pack(*[msg[key] for key in keys[2 if from_game else 1:]])
+        layout = _struct_layout(msg, ARRAY_LAYOUTS)
+        if layout is not None:
+            tag, header, keys, fmt, from_game = layout
+            payload = _pack_arrays(tag, fmt, [msg[key] for key in keys[2 if from_game else 1:]])
+    except (struct.error, TypeError):  # Values that do not fit in the layout
+        payload = None
+    if payload is None:
+        payload = bytes([PICKLE_TAG]) + pickle.dumps(msg)
+    return LENGTH.pack(len(payload)) + payload
+
+
+def decode(payload):
+    """
+    Decode the payload of a frame
+
+    Args:
+        payload (bytes): payload without the length prefix
+
+    Returns:
+        the decoded message
+    """
+    tag = payload[0]
+    if tag == PICKLE_TAG:
+        return pickle.loads(payload[1:])
+    tag, header, keys, fmt, from_game = LAYOUT_BY_TAG[tag]
+    values = tuple(_unpack_arrays(fmt, payload[1:]) if isinstance(fmt, str) else fmt.unpack(payload[1:]))
+    if from_game:
+        return dict(zip(keys, (GAME_ID, header) + values))
+    return dict(zip(keys, (header,) + values))
+
+
+def subscribed(subscription, msg):
+    """
+    Whether a broadcast message matches the subscription of a client
+
+    Args:
+        subscription (dict): "types" and "owners" of the broadcasts the client receives (None for any), every broadcast if None
+        msg (dict): broadcast message
+
+    Returns:
+        bool: the message has to be sent to the client
+    """
+    if subscription is None:
+        return True
+    types, owners = subscription.get("types"), subscription.get("owners")
+    return (types is None or msg.get("Msg type") in types) and (owners is None or msg.get("owner") in owners)
+
+
+class Decoder:
+    """ Streaming decoder: rebuild the messages from reads that may hold partial or several frames """
+    def __init__(self):
+        self.buffer = bytearray()
+
+
+    def feed(self, data):
+        """
+        Add received bytes and return every message that is now complete
+
+        Args:
+            data (bytes): bytes read from the socket
+
+        Returns:
+            list: the complete messages, in the order they were sent
+        """
+        self.buffer += data
+        messages, offset = [], 0
+        while len(self.buffer) - offset >= LENGTH.size:
+            size = LENGTH.unpack_from(self.buffer, offset)[0]
+            end = offset + LENGTH.size + size
+            if len(self.buffer) < end:  # Wait for the rest of the frame
+                break
+            messages.append(decode(bytes(self.buffer[offset+LENGTH.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return messages
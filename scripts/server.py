@@ -5,12 +5,15 @@ __license__ = "Apache License 2.0"
 __version__ = "1.0.0"
 
 
-import socket, pickle
-from threading import Thread, Lock
-import sys, argparse, os
+import socket
+from threading import Thread, Lock, Event
+import sys, argparse, os, asyncio
 from game import Game
+from map_generator import load_generated_map
+from protocol import encode, Decoder, subscribed
+from metrics import Metrics
 from my_constants import *
-from time import sleep
+from time import sleep, perf_counter
 
 if os.name == "nt": #If you are on Windows
     screen_resolution_to_fix = True  #Set this variable to True if you face resolution issues when the GUI appears
@@ -21,16 +24,11 @@ if os.name == "nt": #If you are on Windows
 
 class Server:
     """ Server handling communication between the agents and the game """
-    def __init__(self, conf, nb_agents, map_id):
-        """ Initialize the server """
-        self.game = Game(nb_agents, map_id)
-        self.nb_disconnected = 0
-        self.id_count = 0
-        self.conf = conf
-        self.nb_agents = nb_agents
-        self.clients = []
+    def __init__(self, conf, nb_agents, map_id, headless=False, tick_rate=10, metrics=None):
+        """ Initialize the server, metrics is a Metrics instance (None to disable the instrumentation) """
+        self.init_state(conf, nb_agents, map_id, headless, tick_rate, metrics)
         self.clients_lock = Lock()
-        print(f"Server configuration: {conf}")
+        self.send_locks = {}    #socket -> lock held while writing a frame, replies and broadcasts are never interleaved
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)    #SO_REUSEADDR flag tells the kernel to reuse a local socket in TIME_WAIT state, without waiting for its natural timeout to expire.
         self.s.bind(conf)
@@ -38,17 +36,46 @@ class Server:
         self.start()
 
 
+    def init_state(self, conf, nb_agents, map_id, headless, tick_rate, metrics):
+        """ State shared by the threaded and the asyncio servers: game, metrics, clients and their subscriptions """
+        self.game = Game(nb_agents, map_id, headless, tick_rate)
+        self.metrics = metrics
+        self.finished = Event()     #set once every agent is disconnected
+        self.nb_disconnected = 0
+        self.id_count = 0
+        self.conf = conf
+        self.nb_agents = nb_agents
+        self.clients = {}   #connection of a client -> its id (socket, threaded server) or the queue of its frames (writer, asyncio server)
+        self.subscriptions = {}     #id of a client -> broadcasts it receives (see SUBSCRIBE), every broadcast if missing
+        print(f"Server configuration: {conf}")
+
+
     def start(self):
         """ Start listening to incoming clients """
         print("Server ready! Waiting for connections...")
         while self.id_count < self.nb_agents:
             conn, addr = self.s.accept()
-            with self.clients_lock:
-                self.clients.append(conn)
             Thread(target=self.client_cb, daemon=True, args=(conn, addr, self.id_count)).start()
             self.id_count += 1
             sleep(0.1)
-        self.game.gui.render()
+        self.run()
+
+
+    def run(self):
+        """ Render the game, or simply wait for the agents in headless mode """
+        if self.game.gui is not None:
+            self.game.gui.render()
+        else:
+            self.finished.wait()
+
+
+    def stop(self):
+        """ Stop the rendering once every agent is disconnected """
+        if self.game.gui is not None:
+            self.game.gui.running = False
+        if self.metrics is not None:
+            self.metrics.close()
+        self.finished.set()
     
 
     def client_cb(self, conn, addr, client_id):
@@ -56,53 +83,257 @@ class Server:
         print(f"Connected to {addr[0]} on port {addr[1]}")
         self.game.nb_ready += 1
 
-        conn.send(pickle.dumps((client_id)))
+        conn.sendall(encode(client_id))
+        with self.clients_lock:     #broadcasts are only sent once the client knows its id
+            self.send_locks[conn] = Lock()
+            self.clients[conn] = client_id
+        decoder = Decoder()
 
         try:
             while True:
-                msg = pickle.loads(conn.recv(1024))
-                if msg["header"] == BROADCAST_MSG:
-                    msg["sender"] = client_id
-                    self.send_to_all(conn, msg)
-                else:
-                    reply = self.game.process(msg, client_id)
-                    conn.send(pickle.dumps(reply))
+                data = conn.recv(65536)
+                if not data:    #the agent closed the connection
+                    break
+                for msg in decoder.feed(data):  #a read may hold a partial message or several pipelined ones
+                    if msg["header"] == BROADCAST_MSG:
+                        msg["sender"] = client_id
+                        self.send_to_all(conn, msg)
+                    else:
+                        reply = encode(self.process(msg, client_id))
+                        with self.send_locks[conn]:
+                            conn.sendall(reply)
         except Exception as e:
-            pass
+            self.client_error(client_id, e)
         finally:
             print(f"Closing connection with {addr[0]} on port {addr[1]}")
             with self.clients_lock:
-                self.clients.remove(conn)
+                self.clients.pop(conn, None)
+                self.send_locks.pop(conn, None)
+                self.subscriptions.pop(client_id, None)
                 conn.close()
                 self.nb_disconnected += 1
                 if self.nb_disconnected >= self.nb_agents:
-                    self.game.gui.running = False
+                    self.stop()
                     sys.exit()
 
 
+    def client_error(self, client_id, error):
+        """ Report the exception that closed the connection of a client (also recorded in the metrics if they are enabled) """
+        print(f"Error with client {client_id}: {error!r}")
+        if self.metrics is not None:
+            self.metrics.record_error(error)
+
+
+    def process(self, msg, client_id):
+        """ Reply to a request of a client: statistics of the server, subscription, or processed by the game """
+        if self.metrics is not None:
+            self.metrics.record_message(msg["header"])
+        if msg["header"] == GET_STATS:
+            return {"sender": GAME_ID, "header": GET_STATS, "stats": self.metrics.snapshot() if self.metrics is not None else None}
+        if msg["header"] == SUBSCRIBE:
+            return self.subscribe(msg, client_id)
+        if self.metrics is None:
+            return self.game.process(msg, client_id)
+        start = perf_counter()
+        reply = self.game.process(msg, client_id)
+        self.metrics.record_process(msg["header"], perf_counter() - start)
+        return reply
+
+
+    def subscribe(self, msg, client_id):
+        """ Choose the broadcasts a client receives: only the given "types" and/or "owners" of the broadcast messages (None for any) """
+        subscription = {"types": msg.get("types"), "owners": msg.get("owners")}
+        self.subscriptions[client_id] = subscription
+        return dict({"sender": GAME_ID, "header": SUBSCRIBE}, **subscription)
+
+
+    def send_to_all(self, sender, msg):
+        """ Broadcast a msg to all clients except the 'sender' (and the clients that did not subscribe to it) """
+        start = perf_counter() if self.metrics is not None else None
+        frame = encode(msg)     #serialized once for every recipient
+        with self.clients_lock:     #the lock only protects the list of the clients, the frames are sent without it
+            recipients = [(client, self.send_locks[client]) for client, client_id in self.clients.items()
+                          if client != sender and subscribed(self.subscriptions.get(client_id), msg)]
+        for client, send_lock in recipients:
+            try:
+                with send_lock:
+                    client.sendall(frame)
+            except OSError:     #the client is disconnecting, its own thread removes it
+                pass
+        fanout = len(recipients)
+        if start is not None:
+            self.metrics.record_message(BROADCAST_MSG)
+            self.metrics.record_broadcast(perf_counter() - start, fanout)
+
+
+
+class AsyncServer(Server):
+    """ Server handling every agent from a single asyncio event loop instead of a thread per client """
+    def __init__(self, conf, nb_agents, map_id, headless=False, tick_rate=10, max_queue=64, metrics=None):
+        """ Initialize the server, metrics is a Metrics instance (None to disable the instrumentation) """
+        self.init_state(conf, nb_agents, map_id, headless, tick_rate, metrics)
+        self.max_queue = max_queue  #number of pending frames above which the requests of an agent are not read anymore until its replies are sent, and the broadcasts to it are dropped
+        self.all_connected = Event()
+        self.startup_error = None   #exception raised by the event loop before it could accept the agents (e.g. port already in use)
+        self.start()
+
+
+    def start(self):
+        """ Run the event loop in the background and render the game once every agent is connected """
+        print("Server ready! Waiting for connections...")
+        Thread(target=asyncio.run, daemon=True, args=(self.serve(),)).start()
+        self.all_connected.wait()
+        if self.startup_error is not None:  #raised in the main thread, like the errors of the threaded server
+            raise self.startup_error
+        self.run()
+
+
+    async def serve(self):
+        """ Accept the agents and wait until all of them are disconnected """
+        self.done = asyncio.Event()
+        try:
+            self.server = await asyncio.start_server(self.client_cb, *self.conf, reuse_address=True)
+        except Exception as e:  #the main thread is waiting for the agents: wake it up with the error
+            self.startup_error = e
+            self.all_connected.set()
+            return
+        await self.done.wait()
+
+
+    async def client_cb(self, reader, writer):
+        """ Handle the interactions with a client """
+        if self.id_count >= self.nb_agents:     #every agent is already connected
+            writer.close()
+            return
+        client_id = self.id_count
+        self.id_count += 1
+        if self.id_count >= self.nb_agents:
+            self.server.close()     #stop listening, the connections already opened are kept
+            self.all_connected.set()
+
+        addr = writer.get_extra_info("peername")
+        print(f"Connected to {addr[0]} on port {addr[1]}")
+        self.game.nb_ready += 1
+
+        queue = asyncio.Queue()
+        queue.client_id = client_id     #identifies the queue in the metrics
+        self.clients[writer] = queue
+        sender = asyncio.create_task(self.send_cb(writer, queue))
+        queue.put_nowait(encode(client_id))
+        decoder = Decoder()
+
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:    #the agent closed the connection
+                    break
+                for msg in decoder.feed(data):
+                    if msg["header"] == BROADCAST_MSG:
+                        msg["sender"] = client_id
+                        self.send_to_all(writer, msg)
+                    else:   #requests are processed one at a time by the event loop, no lock is needed around the game
+                        queue.put_nowait(encode(self.process(msg, client_id)))
+                if self.metrics is not None:
+                    self.metrics.record_queue_depth(client_id, queue.qsize())
+                if queue.qsize() > self.max_queue:  #backpressure: wait for the agent to read its replies before reading more requests
+                    await queue.join()
+        except Exception as e:
+            self.client_error(client_id, e)
+        finally:
+            print(f"Closing connection with {addr[0]} on port {addr[1]}")
+            del self.clients[writer]
+            self.subscriptions.pop(client_id, None)
+            queue.put_nowait(None)
+            await sender
+            writer.close()
+            self.nb_disconnected += 1
+            if self.nb_disconnected >= self.nb_agents:
+                self.stop()
+                self.done.set()
+
+
+    async def send_cb(self, writer, queue):
+        """ Write the queued frames of a client, a slow client only delays its own queue
+
+        After a write error the connection is closed and the frames queued later are dropped, but still marked as done \
+        so that client_cb never waits on the queue forever.
+        """
+        running, failed = True, False
+        while running:
+            frames = [await queue.get()]
+            while not queue.empty():    #send everything that is already queued in a single write
+                frames.append(queue.get_nowait())
+            running = None not in frames
+            if not failed:
+                try:
+                    writer.writelines([frame for frame in frames if frame is not None])
+                    await writer.drain()
+                except Exception as e:
+                    print(f"Failed to send to client {queue.client_id}: {e!r}")
+                    failed = True
+                    writer.close()  #the reads of client_cb end as well
+            for _ in frames:
+                queue.task_done()
+
+
     def send_to_all(self, sender, msg):
-        """ Broadcast a msg to all clients except the 'sender' """
-        with self.clients_lock:
-            for client in self.clients:
-                if client != sender:
-                    client.send(pickle.dumps(msg))
+        """ Queue a broadcast msg for all the subscribed clients except the 'sender' without waiting for the sockets
+
+        The broadcast is dropped for a client that already has max_queue frames waiting: a client that does not read its \
+        socket cannot make the memory of the server grow.
+        """
+        start = perf_counter() if self.metrics is not None else None
+        frame = encode(msg)
+        fanout, dropped = 0, 0
+        for writer, queue in self.clients.items():
+            if writer != sender and subscribed(self.subscriptions.get(queue.client_id), msg):
+                if queue.qsize() >= self.max_queue:
+                    dropped += 1
+                    continue
+                queue.put_nowait(frame)
+                fanout += 1
+                if start is not None:
+                    self.metrics.record_queue_depth(queue.client_id, queue.qsize())
+        if start is not None:
+            self.metrics.record_message(BROADCAST_MSG)
+            self.metrics.record_broadcast(perf_counter() - start, fanout, dropped)
 
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--ip_server", help="Ip address of the server", type=str, default="localhost")
-    parser.add_argument("-nb", "--nb_agents", help="Number of agents: 1, 2, 3 or 4", type=int, default=2)
+    parser.add_argument("-nb", "--nb_agents", help="Number of agents: 1 to 4 on the maps of the config file, any number on a generated map", type=int, default=2)
     parser.add_argument("-mi", "--map_id", help="Map to load: 1 or 2", type=int, default=1)
+    parser.add_argument("-g", "--generate", help="Generate a map of the given size instead, e.g. 200x200", type=str, default=None)
+    parser.add_argument("-s", "--seed", help="Seed of the generated map", type=int, default=0)
+    parser.add_argument("-d", "--obstacle_density", help="Probability of a cell of the generated map to be an obstacle", type=float, default=0.0)
+    parser.add_argument("-a", "--asyncio", help="Serve every agent from a single asyncio event loop", action="store_true")
+    parser.add_argument("--headless", help="Run without the GUI (pygame is not imported)", action="store_true")
+    parser.add_argument("-t", "--tick_rate", help="Frame rate of the GUI, 0 to render as fast as possible", type=int, default=10)
+    parser.add_argument("--stats", help="Record the metrics of the server (answered to GET_STATS requests)", action="store_true")
+    parser.add_argument("--stats_file", help="Also write the metrics to this JSON file periodically", type=str, default=None)
+    parser.add_argument("--stats_interval", help="Seconds between two writes of the metrics file", type=float, default=5.0)
 
 
     args = parser.parse_args()
     port = 5555
 
-    if not args.nb_agents in range(1, 5):    #Game are only designed for 1 to 4 agents
+    map_id = args.map_id
+    if args.generate is not None:   #Generated maps can hold any number of agents
+        if args.nb_agents < 1:
+            print("There should be at least 1 agent!")
+            sys.exit()
+        width, height = (int(size) for size in args.generate.split("x"))
+        map_id = load_generated_map(width, height, args.nb_agents, args.seed, args.obstacle_density)
+    elif not args.nb_agents in range(1, 5):    #Game are only designed for 1 to 4 agents
         print("The number of agents should range between 1 and 4!")
         sys.exit()
-    if not args.map_id in range(1, 3):    #There are only 2 maps
+    elif not args.map_id in range(1, 3):    #There are only 2 maps
         print("There are only 2 maps!")
         sys.exit()
-    server = Server((args.ip_server, port), args.nb_agents, args.map_id)
\ No newline at end of file
+    metrics = Metrics(args.stats_file, args.stats_interval) if args.stats or args.stats_file is not None else None
+    if args.asyncio:
+        server = AsyncServer((args.ip_server, port), args.nb_agents, map_id, args.headless, args.tick_rate, metrics=metrics)
+    else:
+        server = Server((args.ip_server, port), args.nb_agents, map_id, args.headless, args.tick_rate, metrics=metrics)
\ No newline at end of file
@@ -0,0 +1,156 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" In-process simulation: the agents are wired to the game without sockets and stepped in lockstep """
+
+from collections import deque
+import argparse, time
+import numpy as np
+
+from my_constants import *
+from protocol import subscribed
+from game import Game
+from agent import Agent
+from map_generator import resolve_map
+
+
+class LocalTransport:
+    """ Transport with the same interface as Network, messages are given to the LocalServer instead of a socket """
+    def __init__(self, server, client_id):
+        self.server = server
+        self.id = client_id
+        self.replies = deque()      #replies of the game waiting to be received by the agent
+        self.broadcasts = deque()   #messages of the other agents waiting to be received by the agent
+
+    def send(self, data):
+        self.server.dispatch(self.id, data)
+
+    def send_many(self, messages):
+        for data in messages:
+            self.send(data)
+
+    def request(self, data, timeout=None):
+        self.send(data)
+        return self.receive()
+
+    def request_many(self, messages, timeout=None):
+        self.send_many(messages)
+        return [self.receive() for _ in messages]
+
+    def receive(self, timeout=None):
+        return self.replies.popleft()
+
+    def receive_broadcast(self, timeout=None):
+        """ Next message broadcast by another agent, None if there is none (never waits) """
+        return self.broadcasts.popleft() if self.broadcasts else None
+
+
+class LocalServer:
+    """ In-process counterpart of Server: route the messages of the agents to the game or to the other agents """
+    def __init__(self, nb_agents, map_id):
+        self.game = Game(nb_agents, map_id, headless=True)
+        self.transports = []
+        self.subscriptions = {}     #id of a client -> broadcasts it receives (see SUBSCRIBE)
+        self.nb_requests = 0
+        self.nb_broadcasts = 0
+        self.nb_deliveries = 0  #broadcasts received by the agents
+
+
+    def connect(self):
+        """ Create the transport of a new agent """
+        transport = LocalTransport(self, len(self.transports))
+        self.transports.append(transport)
+        self.game.nb_ready += 1
+        return transport
+
+
+    def dispatch(self, client_id, msg):
+        """ Process a message sent by an agent, the replies are queued in the inboxes of the agents """
+        if msg["header"] == BROADCAST_MSG:
+            msg = dict(msg, sender=client_id)
+            self.nb_broadcasts += 1
+            for transport in self.transports:
+                if transport.id != client_id and subscribed(self.subscriptions.get(transport.id), msg):
+                    transport.broadcasts.append(msg)
+                    self.nb_deliveries += 1
+        elif msg["header"] == SUBSCRIBE:
+            self.subscriptions[client_id] = {"types": msg.get("types"), "owners": msg.get("owners")}
+            self.transports[client_id].replies.append(dict({"sender": GAME_ID, "header": SUBSCRIBE}, **self.subscriptions[client_id]))
+        else:
+            self.nb_requests += 1
+            self.transports[client_id].replies.append(self.game.process(msg, client_id))
+
+
+def run_episode(nb_agents, map_id, max_steps=5000, scoring="inverse_square"):
+    """
+    Run a whole episode in the current process
+
+    Args:
+        nb_agents (int): number of agents
+        map_id (int or dict): map to load (id of the config file or configuration of a generated map)
+        max_steps (int, optional): the episode is stopped after this number of steps. Defaults to 5000.
+        scoring (str, optional): kernel used by the agents to score the cells to explore. Defaults to "inverse_square".
+
+    Returns:
+        dict: metrics of the episode
+    """
+    start = time.perf_counter()
+    server = LocalServer(nb_agents, map_id)
+    agents = [Agent(None, scoring, network=server.connect(), threaded=False) for _ in range(nb_agents)]
+
+    steps_to_completion = [None]*nb_agents
+    step = 0
+    while step < max_steps and None in steps_to_completion:
+        step += 1
+        for agent in agents:    #same loop as the main of agent.py
+            if steps_to_completion[agent.agent_id] is None:
+                agent.apply_updates()
+                agent.explore_cell()
+                agent.choose_action()
+                if agent.box_reached:
+                    steps_to_completion[agent.agent_id] = step
+        for agent in agents:
+            deliver(agent)
+
+    visited = np.zeros_like(agents[0].explo, dtype=bool)
+    for agent in agents:
+        visited |= agent.explo == 1
+    return {
+        "nb_agents": nb_agents,
+        "map_id": map_id if not isinstance(map_id, dict) else f"{map_id['width']}x{map_id['height']}",
+        "completed": None not in steps_to_completion,
+        "steps": step,
+        "steps_to_completion": steps_to_completion,
+        "cells_visited": [int(np.sum(agent.explo)) for agent in agents],
+        "distinct_cells_visited": int(np.sum(visited)),
+        "requests": server.nb_requests,
+        "broadcasts": server.nb_broadcasts,
+        "deliveries": server.nb_deliveries,
+        "duration": time.perf_counter() - start,
+    }
+
+
+def deliver(agent):
+    """ Give every pending broadcast of its transport to an agent (the replies are handled by choose_action) """
+    msg = agent.network.receive_broadcast()
+    while msg is not None:
+        agent.handle_msg(msg)
+        msg = agent.network.receive_broadcast()
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-nb", "--nb_agents", help="Number of agents: 1 to 4 on the maps of the config file, any number on a generated map", type=int, default=2)
+    parser.add_argument("-mi", "--map_id", help="Map to load: 1, 2 or the size of a generated map (e.g. 50x50)", type=str, default="1")
+    parser.add_argument("-s", "--seed", help="Seed of the generated map", type=int, default=0)
+    parser.add_argument("-d", "--obstacle_density", help="Probability of a cell of the generated map to be an obstacle", type=float, default=0.0)
+    parser.add_argument("-n", "--nb_episodes", help="Number of episodes to run", type=int, default=1)
+    parser.add_argument("-m", "--max_steps", help="Maximum number of steps of an episode", type=int, default=5000)
+    args = parser.parse_args()
+
+    for _ in range(args.nb_episodes):
+        print(run_episode(args.nb_agents, resolve_map(args.map_id, args.nb_agents, args.seed, args.obstacle_density), args.max_steps))
@@ -0,0 +1,83 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Cold-start benchmark of the agent: import time of agent.py measured with `python -X importtime` in fresh interpreters
+
+The exit code is 1 if a heavy optional library is imported at startup or if the median import time is over the budget.
+"""
+
+import argparse, os, subprocess, sys
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FORBIDDEN = ["matplotlib", "imageio", "pygame"]    #only needed to plot or render, must be imported lazily
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter with -X importtime
+
+    Args:
+        module (str): module to import
+
+    Returns:
+        dict: cumulative import time (in microseconds) of every imported module
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=SCRIPTS_DIR,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:     #skip the header
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def benchmark(module="agent", repeat=5, top=10):
+    """
+    Measure the cold start of a module
+
+    Args:
+        module (str, optional): module to import. Defaults to "agent".
+        repeat (int, optional): number of fresh interpreters. Defaults to 5.
+        top (int, optional): number of slowest top-level imports to report. Defaults to 10.
+
+    Returns:
+        dict: median import time of the module (ms), slowest imports of the first run (ms) and forbidden modules that were imported
+    """
+    runs = [import_times(module) for _ in range(repeat)]
+    totals = sorted(times[module] for times in runs)
+    # Packages imported directly by the module are reported without their submodules
+    slowest = sorted(((name, time) for name, time in runs[0].items() if name != module and "." not in name), key=lambda item: -item[1])
+    return {
+        "module": module,
+        "median_ms": totals[len(totals)//2]/1000,
+        "slowest_ms": {name: time/1000 for name, time in slowest[:top]},
+        "forbidden": [name for name in FORBIDDEN if name in runs[0]],
+    }
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--module", help="Module to import", type=str, default="agent")
+    parser.add_argument("-r", "--repeat", help="Number of fresh interpreters", type=int, default=5)
+    parser.add_argument("-b", "--budget", help="Maximum median import time in ms, 0 to disable", type=float, default=0)
+    args = parser.parse_args()
+
+    result = benchmark(args.module, args.repeat)
+    print(f"{result['module']}: {result['median_ms']:.1f} ms (median of {args.repeat} cold starts)")
+    for name, time in result["slowest_ms"].items():
+        print(f"    {name:<20} {time:8.1f} ms")
+    failed = False
+    if result["forbidden"]:
+        print(f"Imported at startup: {', '.join(result['forbidden'])}")
+        failed = True
+    if args.budget and result["median_ms"] > args.budget:
+        print(f"Over the budget of {args.budget} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,94 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Trajectory log of a robot: one binary record per step, appended during the run and replayed later to render the GIF
+
+The file starts with a header (magic, version, id of the agent, width and height of the map). Every record holds the
+position of the robot, its cell value, its flags, the positions of its key and box, and the believes that changed since
+the previous record (flat indexes and new values), so the whole believes' grid never has to be written again.
+"""
+
+import os, struct
+import numpy as np
+
+
+MAGIC = b"TRJ1"
+VERSION = 1
+HEADER = struct.Struct("!4sHiii")
+RECORD = struct.Struct("!iiidBiiiiI")   #step, x, y, cell_val, flags, key x, key y, box x, box y, number of changed believes
+NO_POSITION = (-1, -1)
+
+""" RECORD FLAGS """
+EXPLORED = 1    #the cell of the robot is explored
+KEY_COLLECTED = 2
+BOX_REACHED = 4
+
+
+class TrajectoryRecorder:
+    """ Append the steps of a robot to its trajectory log """
+    def __init__(self, path, agent):
+        """
+        Args:
+            path (str): file of the log, overwritten if it exists
+            agent (Agent): robot to record
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, agent.agent_id, agent.w, agent.h))
+        self.believes = np.ones(agent.w*agent.h, dtype=np.float32)    #believes of the previous record
+        self.step = 0
+
+
+    def record(self, agent):
+        """ Append the current state of the robot """
+        believes = agent.believes.astype(np.float32).ravel()
+        changed = np.flatnonzero(believes != self.believes)
+        self.believes = believes
+        flags = EXPLORED*int(agent.explo[agent.x, agent.y] == 1) + KEY_COLLECTED*agent.key_collected + BOX_REACHED*agent.box_reached
+        self.file.write(RECORD.pack(self.step, agent.x, agent.y, agent.cell_val, flags, *(agent.key_position or NO_POSITION),
+                                    *(agent.box_position or NO_POSITION), len(changed)))
+        self.file.write(changed.astype(">i4").tobytes())
+        self.file.write(believes[changed].astype(">f4").tobytes())
+        self.step += 1
+
+
+    def close(self):
+        self.file.close()
+
+
+def read_trajectory(path):
+    """
+    Replay a trajectory log
+
+    Args:
+        path (str): file written by a TrajectoryRecorder
+
+    Yields:
+        dict: state of the robot at each step (same keys as the snapshots plotted by visualization.BeliefFigure, plus "agent_id" and "step"). \
+            The arrays are updated in place from one step to the next.
+    """
+    with open(path, "rb") as log:
+        magic, version, agent_id, w, h = HEADER.unpack(log.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a trajectory log")
+        explo = np.zeros((w, h))
+        believes = np.ones(w*h)
+        cell_values = np.zeros((w, h))
+        while True:
+            data = log.read(RECORD.size)
+            if len(data) < RECORD.size:     #end of the log (the last record may be truncated if the robot was interrupted)
+                return
+            step, x, y, cell_val, flags, key_x, key_y, box_x, box_y, n = RECORD.unpack(data)
+            changes = log.read(8*n)
+            if len(changes) < 8*n:
+                return
+            believes[np.frombuffer(changes, ">i4", n)] = np.frombuffer(changes, ">f4", n, 4*n)
+            cell_values[x, y] = cell_val
+            if flags & EXPLORED:
+                explo[x, y] = 1
+            yield {"agent_id": agent_id, "step": step, "explo": explo, "believes": believes.reshape(w, h), "cell_values": cell_values, "x": x, "y": y,
+                   "key_position": (key_x, key_y) if key_x >= 0 else None, "box_position": (box_x, box_y) if box_x >= 0 else None,
+                   "key_collected": bool(flags & KEY_COLLECTED), "box_reached": bool(flags & BOX_REACHED)}
@@ -0,0 +1,268 @@
+__author__ = "Aybuke Ozturk Suri, Johvany Gustave"
+__copyright__ = "Copyright 2023, IN512, IPSA 2023"
+__credits__ = ["Aybuke Ozturk Suri", "Johvany Gustave"]
+__license__ = "Apache License 2.0"
+__version__ = "1.0.0"
+
+""" Optional visualization of the agents: believes' grids, background rendering and GIF of the path
+
+This module is only imported when something is plotted, so that an agent does not pay for matplotlib at startup.
+"""
+
+import os
+from threading import Thread
+from queue import Queue
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from trajectory import read_trajectory
+
+
+def plot_believes(agent, folder, alpha=1.0, display=True):
+    """
+    Plot the believes' grid of a robot
+
+    Args:
+        agent (Agent): robot whose believes are plotted
+        folder (str): folder where the image is saved
+        alpha (float, optional): Opacity of the window (1.0=vivid, 0.0=transparent). Defaults to 1.0.
+        display (bool, optional): display the grid on the screen. Defaults to True.
+    """
+    # Enable interactive mode to continue execution of the code after the plot is shown
+    # Note: The "block" parameter on the "plt.show()" function doesn't seem to work on macOS.     
+    if display: # If we want to display the plot         
+        plt.ion()
+
+    plt.figure(agent.agent_id+1, figsize=(agent.w/3, agent.h/3))
+    plt.clf() # Clear the matplotlib plot every time the robot moves
+
+    # Creating colormap with explored cells and the agent's position
+    colormap = np.copy(agent.explo)
+    colormap[agent.x, agent.y] = 3
+
+    colors = ["Reds", "Blues", "Greens", "Oranges"]
+    cmap = colors[agent.agent_id % len(colors)]
+
+    if agent.key_position or agent.box_position:
+        if agent.key_position:
+            colormap[agent.key_position[0], agent.key_position[1]] = 2
+        if agent.box_position:
+            colormap[agent.box_position[0], agent.box_position[1]] = 2
+
+    plt.pcolormesh(np.flip(colormap.T, 0), cmap=cmap, edgecolors='k', vmin=0, vmax=3, alpha=alpha)
+
+    # Creating array with cell values in visited cells and believes elsewhere
+    cellval_or_belief = np.maximum(agent.believes, agent.cell_values)
+
+    if not agent.box_reached:   # If the box hasn't been reached yet    
+        # Adding cell values or believes as annotations on every cell
+        for i in range(agent.w):
+            for j in range(agent.h):
+                if (i, agent.w-(j+1)) == (agent.x, agent.y):
+                    plt.annotate(str(round(np.flip(cellval_or_belief.T, 0)[j][i], 1)), xy=(i+0.5, j+0.5), ha='center', va='center', color='white')
+                else:
+                    plt.annotate(str(round(np.flip(cellval_or_belief.T, 0)[j][i], 1)), xy=(i+0.5, j+0.5), ha='center', va='center', color='black')
+
+        # Add total number of visited cells and other important information
+        plt.annotate(f'Number of visited cells: {int(np.sum(agent.explo))}', xy=(0,-1), color='black', annotation_clip=False)
+        plt.annotate(f'Position of the key: {agent.key_position}', xy=(0,-2), color='black', annotation_clip=False)
+        plt.annotate(f'Position of the box: {agent.box_position}', xy=(0,-3), color='black', annotation_clip=False)
+        plt.annotate(f'Key collected: {agent.key_collected}', xy=(0,-4), color='black', annotation_clip=False)
+        plt.annotate(f'Box reached with key: {agent.box_reached}', xy=(0,-5), color='black', annotation_clip=False)
+
+    else:   # If the box has been reached
+        text = "Congrats! The robot reached its box!\nPress any key in the terminal to exit..."
+        plt.text(agent.w/2, agent.h/2, text, ha='center', va='center', color='black', fontsize=18, fontweight='bold')
+
+    plt.axis('equal')
+    plt.axis('off')
+    plt.title(f'GridBelieves for robot {agent.agent_id+1}')
+    plt.tight_layout() # Reduce margins
+
+    if display: # If we want to display the plot 
+        plt.draw()
+
+    foldername = "robot" + str(agent.agent_id+1)
+    full_path = os.path.join(folder, foldername)
+
+    if not os.path.exists(full_path):   # Check if the folder doesn't exist
+        os.makedirs(full_path)          # Create the directory
+
+    filename = "explo_" + str(int(np.sum(agent.explo))) + ".jpg"
+    plt.savefig(folder + "/" + foldername + "/" + filename)
+
+    if display:         # If we want to display the plot 
+        plt.pause(0.2)  # Necessary for the plot to appear on macOS
+
+
+def path_gif(agent_id, folder, trajectory_path, every=1):
+    """
+    Create a GIF of the path of a robot from its trajectory log
+
+    Args:
+        agent_id (int): id of the robot
+        folder (str): folder of the images of the robots
+        trajectory_path (str): file written by the TrajectoryRecorder of the robot
+        every (int, optional): keep one step every N steps. Defaults to 1.
+    """
+    foldername = "robot" + str(agent_id+1)
+    full_path = os.path.join(folder, foldername)
+    
+    if not os.path.exists(full_path):   # Check if the folder doesn't exist
+        os.makedirs(full_path)          # Create the directory
+    
+    filenameGIF = "complete_path_robot_" + str(agent_id+1) + ".gif"
+    GIF_path = folder + "/" + foldername + "/" + filenameGIF   # GIF file relative path
+    render_gif(trajectory_path, GIF_path, every)
+    print(f'GIF created and saved to {GIF_path}')
+
+
+def render_gif(log_path, gif_path, every=1):
+    """
+    Render the GIF of a trajectory log: the frames are drawn and encoded one at a time, never held in memory together
+
+    Args:
+        log_path (str): file written by a TrajectoryRecorder
+        gif_path (str): GIF file to create
+        every (int, optional): keep one step every N steps (the last step is always kept). Defaults to 1.
+
+    Returns:
+        int: number of frames of the GIF
+    """
+    import imageio
+
+    figure, nb_frames, last = None, 0, None
+    with imageio.get_writer(gif_path, mode="I") as writer:
+        for state in read_trajectory(log_path):
+            if figure is None:
+                figure = BeliefFigure(state["agent_id"], *state["explo"].shape)
+            last = state
+            if state["step"] % every == 0:
+                figure.draw(state)
+                writer.append_data(figure.rgb())
+                nb_frames += 1
+                last = None
+        if last is not None:
+            figure.draw(last)
+            writer.append_data(figure.rgb())
+            nb_frames += 1
+    return nb_frames
+
+
+def snapshot(agent):
+    """ Copy of the state of a robot needed to plot its believes' grid """
+    return {"explo": agent.explo.copy(), "believes": agent.believes.copy(), "cell_values": agent.cell_values.copy(), "x": agent.x, "y": agent.y,
+            "key_position": agent.key_position, "box_position": agent.box_position, "key_collected": agent.key_collected, "box_reached": agent.box_reached}
+
+
+class BeliefFigure:
+    """ Figure of the believes' grid of a robot, created once and updated in place """
+    def __init__(self, agent_id, w, h):
+        self.agent_id, self.w, self.h = agent_id, w, h
+        self.figure = Figure(figsize=(w/3, h/3))
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+        colors = ["Reds", "Blues", "Greens", "Oranges"]
+        self.mesh = ax.pcolormesh(np.zeros((h, w)), cmap=colors[agent_id % len(colors)], edgecolors='k', vmin=0, vmax=3)
+        # One annotation per cell, updated in place
+        self.cell_texts = [[ax.annotate("", xy=(i+0.5, j+0.5), ha='center', va='center') for j in range(h)] for i in range(w)]
+        self.info_texts = [ax.annotate("", xy=(0, -(k+1)), color='black', annotation_clip=False) for k in range(5)]
+        self.end_text = ax.text(w/2, h/2, "Congrats! The robot reached its box!", ha='center', va='center', color='black', fontsize=18, fontweight='bold', visible=False)
+        ax.axis('equal')
+        ax.axis('off')
+        ax.set_title(f'GridBelieves for robot {agent_id+1}')
+        self.figure.tight_layout() # Reduce margins
+
+
+    def draw(self, snapshot):
+        """ Update the artists of the figure with a snapshot of the robot """
+        # Colormap with explored cells and the agent's position
+        colormap = np.copy(snapshot["explo"])
+        colormap[snapshot["x"], snapshot["y"]] = 3
+        for position in (snapshot["key_position"], snapshot["box_position"]):
+            if position:
+                colormap[position[0], position[1]] = 2
+        self.mesh.set_array(np.flip(colormap.T, 0).ravel())
+
+        # Cell values in visited cells and believes elsewhere
+        cellval_or_belief = np.round(np.maximum(snapshot["believes"], snapshot["cell_values"]), 1)
+        visible = not snapshot["box_reached"]
+        for i in range(self.w):
+            for j in range(self.h):
+                text = self.cell_texts[i][self.h-(j+1)]
+                text.set_text(str(cellval_or_belief[i, j]))
+                text.set_color('white' if (i, j) == (snapshot["x"], snapshot["y"]) else 'black')
+                text.set_visible(visible)
+        infos = [f'Number of visited cells: {int(np.sum(snapshot["explo"]))}', f'Position of the key: {snapshot["key_position"]}',
+                 f'Position of the box: {snapshot["box_position"]}', f'Key collected: {snapshot["key_collected"]}', f'Box reached with key: {snapshot["box_reached"]}']
+        for text, info in zip(self.info_texts, infos):
+            text.set_text(info)
+            text.set_visible(visible)
+        self.end_text.set_visible(not visible)
+
+
+    def save(self, path):
+        self.figure.savefig(path)
+
+
+    def rgb(self):
+        """ Pixels of the figure (height, width, 3) """
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba())[:, :, :3].copy()
+
+
+class BeliefPlotter:
+    """ Throttled rendering of the believes' grid of a robot: a single figure is updated in place and saved from a background thread """
+    def __init__(self, agent, folder, every=10, max_pending=2):
+        """
+        Args:
+            agent (Agent): robot whose believes are plotted
+            folder (str): folder where the images are saved
+            every (int, optional): render every N steps (and on every important event). Defaults to 10.
+            max_pending (int, optional): number of periodic frames that can wait for the renderer, the others are dropped. Defaults to 2.
+        """
+        self.agent_id, self.w, self.h = agent.agent_id, agent.w, agent.h
+        self.folder = folder
+        self.every = every
+        self.step = 0
+        self.last_events = None
+        self.max_pending = max_pending
+        self.queue = Queue()
+        self.figure = None
+        self.worker = Thread(target=self.render_cb, daemon=True)
+        self.worker.start()
+
+
+    def update(self, agent):
+        """ Called by the control loop at every step: only takes a snapshot of the robot when a frame has to be rendered """
+        events = (agent.key_position, agent.box_position, agent.key_collected, agent.box_reached)
+        event = events != self.last_events    # Item found, key collected or box reached
+        due = self.every > 0 and self.step % self.every == 0
+        self.step += 1
+        if not (event or due):
+            return
+        self.last_events = events
+        if event or self.queue.qsize() < self.max_pending: # Important frames are never dropped, periodic ones are skipped when the renderer is late
+            self.queue.put(snapshot(agent))
+
+
+    def close(self):
+        """ Wait for the pending frames to be rendered """
+        self.queue.put(None)
+        self.worker.join()
+
+
+    def render_cb(self):
+        """ Render the queued snapshots (background thread) """
+        while True:
+            state = self.queue.get()
+            if state is None:
+                return
+            if self.figure is None:
+                self.figure = BeliefFigure(self.agent_id, self.w, self.h)
+            self.figure.draw(state)
+            full_path = os.path.join(self.folder, "robot" + str(self.agent_id+1))
+            os.makedirs(full_path, exist_ok=True)
+            self.figure.save(os.path.join(full_path, "explo_" + str(int(np.sum(state["explo"]))) + ".jpg"))
@@ -0,0 +1,135 @@
+""" Parity of the belief engine (scripts/belief.py) with the loop implementation it replaced """
+
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from my_constants import *
+from belief import update_believes, update_known_values, new_item_update, new_items_update
+
+
+CELL_VALUES = [0, 0.25, 0.3, 0.5, 0.6, 1]
+NB_CASES = 500
+
+
+""" LOOP IMPLEMENTATION (copy of the original functions of agent.py) """
+
+def loop_update_believes(x, y, cell_val, w, h, believes, item_found):
+    believes[x, y] = 0
+    for i in range(w):
+        for j in range(h):
+            if x-1 <= i and i <= x+1 and y-1 <= j and j <= y+1:
+                if cell_val in [0, 0.25]:
+                    believes[i, j] = 0
+                elif cell_val in [0.3] and item_found == False:
+                    believes[i, j] = 0
+            elif x-2 <= i and i <= x+2 and y-2 <= j and j <= y+2:
+                if cell_val in [0]:
+                    believes[i, j] = 0
+                elif cell_val in [0.5, 0.6] and item_found == False:
+                    believes[i, j] = 0
+            else:
+                if cell_val in [0.25, 0.3, 0.5, 0.6] and item_found == False:
+                    believes[i, j] = 0
+    return believes
+
+
+def loop_update_known_values(x, y, w, h, found_item_type, found_cell_values):
+    for i in range(w):
+        for j in range(h):
+            if x-1 <= i and i <= x+1 and y-1 <= j and j <= y+1:
+                if found_item_type == KEY_TYPE and found_cell_values[i, j] not in [0.3, 0.6, 1]:
+                    found_cell_values[i, j] = 0.5
+                elif found_item_type == BOX_TYPE and found_cell_values[i, j] not in [1]:
+                    found_cell_values[i, j] = 0.6
+            elif x-2 <= i and i <= x+2 and y-2 <= j and j <= y+2:
+                if found_item_type == KEY_TYPE and found_cell_values[i, j] not in [0.3, 0.5, 0.6, 1]:
+                    found_cell_values[i, j] = 0.25
+                elif found_item_type == BOX_TYPE and found_cell_values[i, j] not in [0.6, 1]:
+                    found_cell_values[i, j] = 0.3
+    found_cell_values[x, y] = 1
+    return found_cell_values
+
+
+def loop_new_item_update(x, y, w, h, found_item_type, believes, explo, cell_values, found_cell_values):
+    found_cell_values = loop_update_known_values(x, y, w, h, found_item_type, found_cell_values)
+    believes = np.ones((w, h))
+    for i in range(w):
+        for j in range(h):
+            if explo[i, j] == 1:
+                believes = loop_update_believes(i, j, cell_values[i, j], w, h, believes, True)
+    return believes, found_cell_values
+
+
+""" RANDOM CASES """
+
+def random_map(rng):
+    """ Size of a map (from 1x1 to 12x12, so that the windows are often clipped) and a cell of it """
+    w, h = rng.integers(1, 13, 2)
+    return int(w), int(h), int(rng.integers(w)), int(rng.integers(h))
+
+
+def random_exploration(rng, w, h):
+    """ Explored cells and their values, with the believes' grid only constrained by them as kept up to date by the agent """
+    explo = (rng.random((w, h)) < 0.3).astype(float)
+    cell_values = explo*rng.choice(CELL_VALUES, (w, h))
+    explored_believes = np.ones((w, h))
+    for i, j in zip(*np.nonzero(explo)):
+        explored_believes = update_believes(i, j, cell_values[i, j], w, h, explored_believes, True)
+    return explo, cell_values, explored_believes
+
+
+@pytest.mark.parametrize("seed", range(NB_CASES))
+def test_update_believes(seed):
+    rng = np.random.default_rng(seed)
+    w, h, x, y = random_map(rng)
+    believes = (rng.random((w, h)) < 0.7).astype(float)
+    cell_val = float(rng.choice(CELL_VALUES))
+    item_found = bool(rng.integers(2))
+    expected = loop_update_believes(x, y, cell_val, w, h, believes.copy(), item_found)
+    np.testing.assert_array_equal(update_believes(x, y, cell_val, w, h, believes.copy(), item_found), expected)
+
+
+@pytest.mark.parametrize("seed", range(NB_CASES))
+def test_update_known_values(seed):
+    rng = np.random.default_rng(seed)
+    w, h, _, _ = random_map(rng)
+    found_cell_values, expected = np.zeros((w, h)), np.zeros((w, h))
+    for _ in range(rng.integers(1, 5)):     # Several items, so that the precedence rules are exercised
+        x, y, item_type = int(rng.integers(w)), int(rng.integers(h)), int(rng.choice([KEY_TYPE, BOX_TYPE]))
+        expected = loop_update_known_values(x, y, w, h, item_type, expected)
+        found_cell_values = update_known_values(x, y, w, h, item_type, found_cell_values)
+        np.testing.assert_array_equal(found_cell_values, expected)
+
+
+@pytest.mark.parametrize("seed", range(NB_CASES))
+@pytest.mark.parametrize("incremental", [False, True])
+def test_new_item_update(seed, incremental):
+    rng = np.random.default_rng(seed)
+    w, h, x, y = random_map(rng)
+    item_type = int(rng.choice([KEY_TYPE, BOX_TYPE]))
+    explo, cell_values, explored_believes = random_exploration(rng, w, h)
+    found_cell_values = rng.choice([0, 0.25, 0.5, 0.6], (w, h))
+    believes = (rng.random((w, h)) < 0.5).astype(float)
+    expected_believes, expected_values = loop_new_item_update(x, y, w, h, item_type, believes.copy(), explo, cell_values, found_cell_values.copy())
+    believes, found_cell_values = new_item_update(x, y, w, h, item_type, believes.copy(), explo, cell_values, found_cell_values.copy(),
+                                                  explored_believes if incremental else None)
+    np.testing.assert_array_equal(believes, expected_believes)
+    np.testing.assert_array_equal(found_cell_values, expected_values)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_new_items_update(seed):
+    """ Several items found at once give the same grids as finding them one after the other """
+    rng = np.random.default_rng(seed)
+    w, h, _, _ = random_map(rng)
+    explo, cell_values, explored_believes = random_exploration(rng, w, h)
+    items = [(int(rng.integers(w)), int(rng.integers(h)), int(rng.choice([KEY_TYPE, BOX_TYPE]))) for _ in range(rng.integers(1, 4))]
+    expected_believes, expected_values = np.ones((w, h)), np.zeros((w, h))
+    for x, y, item_type in items:
+        expected_believes, expected_values = loop_new_item_update(x, y, w, h, item_type, expected_believes, explo, cell_values, expected_values)
+    believes, found_cell_values = new_items_update(items, w, h, np.ones((w, h)), explo, cell_values, np.zeros((w, h)), explored_believes)
+    np.testing.assert_array_equal(believes, expected_believes)
+    np.testing.assert_array_equal(found_cell_values, expected_values)
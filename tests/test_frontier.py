@@ -0,0 +1,61 @@
+""" Scores of the FFT/incremental attraction field (scripts/frontier.py) against a brute-force sum over the believes """
+
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from frontier import KernelScorer, KERNELS
+
+
+SIZES = [(1, 1), (1, 7), (5, 5), (12, 7), (30, 30)]
+NB_STEPS = 30
+
+
+""" BRUTE FORCE """
+
+def brute_force_scores(believes, kernel):
+    """ Sum of the kernel over every (cell, belief of 1) pair, without convolution """
+    w, h = believes.shape
+    a, b = np.nonzero(believes == 1)
+    x, y = np.meshgrid(np.arange(w), np.arange(h), indexing="ij")
+    distance2 = (x[:, :, None] - a)**2 + (y[:, :, None] - b)**2
+    return kernel(distance2.astype(float)).sum(axis=2)
+
+
+def scores(scorer):
+    return np.array([[scorer.score(x, y) for y in range(scorer.h)] for x in range(scorer.w)])
+
+
+def assert_scores(scorer, believes, kernel):
+    expected = brute_force_scores(believes, kernel)
+    np.testing.assert_allclose(scores(scorer), expected, rtol=1e-9, atol=1e-9*np.abs(scorer.kernel).sum())
+
+
+""" TESTS """
+
+@pytest.mark.parametrize("kernel", KERNELS.values(), ids=KERNELS.keys())
+@pytest.mark.parametrize("w, h", SIZES)
+@pytest.mark.parametrize("density", [0.0, 0.1, 0.5, 1.0])
+def test_fft_field(kernel, w, h, density):
+    rng = np.random.default_rng(w*h)
+    believes = np.where(rng.random((w, h)) < density, 1.0, rng.choice([0, 0.5], (w, h)))
+    scorer = KernelScorer(w, h, kernel, max_incremental=0)  #always recomputed with a FFT
+    scorer.update(believes)
+    assert_scores(scorer, believes, kernel)
+
+
+@pytest.mark.parametrize("kernel", KERNELS.values(), ids=KERNELS.keys())
+@pytest.mark.parametrize("w, h", SIZES)
+def test_incremental_field(kernel, w, h):
+    """ Few believes change between two updates, as when the robot moves: the field is updated cell by cell """
+    rng = np.random.default_rng(w + h)
+    believes = np.ones((w, h))
+    scorer = KernelScorer(w, h, kernel)
+    scorer.update(believes)
+    for _ in range(NB_STEPS):
+        changed = rng.integers(0, [w, h], (int(rng.integers(1, 4)), 2))
+        believes[changed[:, 0], changed[:, 1]] = rng.choice([0, 0.5, 1], len(changed))
+        scorer.update(believes)
+        assert_scores(scorer, believes, kernel)
@@ -0,0 +1,111 @@
+""" Parity of the field of the values perceived by the agents (Game.build_map_real) with the loop implementation it replaced,
+and STEP requests (Game.handle_step) against the same moves sent one by one """
+
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from my_constants import *
+from game import Game
+from map_generator import generate_map
+
+
+""" LOOP IMPLEMENTATION (copy of the original Game.load_map and Game.add_val) """
+
+OFFSETS = [[(-1, -1), (0, -1), (1, -1), (-1, 0), (0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)],
+           [(-2, -2), (-1, -2), (0, -2), (1, -2), (2, -2), (-2, -1), (2, -1), (-2, 0), (2, 0), (-2, 1), (2, 1), (-2, 2), (-1, 2), (0, 2), (1, 2), (2, 2)]]
+
+
+def loop_map_real(game):
+    map_real = np.zeros(shape=(game.map_h, game.map_w))
+
+    def add_val(x, y, val):
+        if 0 <= x < game.map_w and 0 <= y < game.map_h:
+            map_real[y, x] = val
+
+    for item in game.keys + game.boxes:
+        for i, sub_list in enumerate(OFFSETS):
+            for dx, dy in sub_list:
+                if dx != 0 or dy != 0:
+                    add_val(item.x + dx, item.y + dy, item.neighbour_percent/(i+1))
+                else:
+                    add_val(item.x, item.y, 1)
+    return map_real
+
+
+@pytest.mark.parametrize("map_id", [1, 2])
+@pytest.mark.parametrize("nb_agents", [1, 2, 3, 4])
+def test_map_real_shipped_maps(map_id, nb_agents):
+    game = Game(nb_agents, map_id, headless=True)
+    np.testing.assert_array_equal(game.map_real, loop_map_real(game))
+
+
+""" STEP REQUESTS """
+
+def positions(game):
+    return [(agent.x, agent.y) for agent in game.agents]
+
+
+@pytest.mark.parametrize("obstacle_density", [0.0, 0.3])
+def test_step_matches_moves(obstacle_density):
+    """ A valid batch gives the same positions and cell values as the same MOVE requests, blocked moves included """
+    rng = np.random.default_rng(0)
+    map_cfg = generate_map(12, 9, 3, seed=1, obstacle_density=obstacle_density)
+    step_game, move_game = Game(3, map_cfg, headless=True), Game(3, map_cfg, headless=True)
+    for _ in range(50):
+        agents = [int(agent) for agent in rng.integers(0, 3, int(rng.integers(1, 10)))]
+        directions = [int(direction) for direction in rng.integers(0, 9, len(agents))]
+        reply = step_game.process({"header": STEP, "directions": directions, "agents": agents}, 0)
+        moves = [move_game.process({"header": MOVE, "direction": direction}, agent) for agent, direction in zip(agents, directions)]
+        assert "error" not in reply
+        assert reply["agents"] == agents
+        assert reply["x"] == [move["x"] for move in moves]
+        assert reply["y"] == [move["y"] for move in moves]
+        assert reply["cell_val"] == [move["cell_val"] for move in moves]
+        assert positions(step_game) == positions(move_game)
+
+
+def test_step_without_agents_moves_the_sender():
+    game = Game(2, 1, headless=True)
+    x, y = game.agents[1].x, game.agents[1].y
+    reply = game.process({"header": STEP, "directions": [0, 0]}, 1)
+    assert reply["agents"] == [1, 1]
+    assert reply["x"] == [x, x] and reply["y"] == [y, y]
+
+
+@pytest.mark.parametrize("msg", [
+    {"header": STEP, "directions": [1, 2], "agents": [0]},  #lengths differ
+    {"header": STEP, "directions": [1], "agents": [0, 1]},
+    {"header": STEP, "directions": [1, 2], "agents": [0, 2]},   #unknown agent
+    {"header": STEP, "directions": [1], "agents": [-1]},
+    {"header": STEP, "directions": [1], "agents": [0.0]},
+    {"header": STEP, "directions": [1, 9]},     #unknown direction
+    {"header": STEP, "directions": [1, -1]},
+    {"header": STEP, "directions": [1, "2"]},
+    {"header": STEP, "directions": [1, None]},
+    {"header": STEP, "directions": [1, 2.0]},
+])
+def test_invalid_step_moves_nobody(msg):
+    """ An invalid batch is rejected before any move: even its valid first move is not applied and nobody is notified """
+    game = Game(2, 1, headless=True)
+    notified = []
+    game.subscribe(lambda: notified.append(True))
+    before = positions(game)
+    reply = game.process(msg, 0)
+    assert isinstance(reply["error"], str)
+    assert reply["agents"] == reply["x"] == reply["y"] == reply["cell_val"] == []
+    assert positions(game) == before
+    assert notified == []
+
+
+def test_step_notifies_once():
+    """ The observers (e.g. the GUI) are notified at the end of the batch, not after each move """
+    game = Game(2, 1, headless=True)
+    notified = []
+    game.subscribe(lambda: notified.append(True))
+    x, y = game.agents[0].x, game.agents[0].y
+    direction = next(i for i, (dx, dy) in enumerate(MOVES) if (dx, dy) != (0, 0) and 0 <= x + dx < game.map_w and 0 <= y + dy < game.map_h)
+    game.process({"header": STEP, "directions": [direction, 0, direction]}, 0)
+    assert notified == [True]
@@ -0,0 +1,68 @@
+""" Bitmap of the obstacles (scripts/obstacles.py) against the boolean mask it encodes """
+
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from obstacles import ObstacleMap
+
+
+SIZES = [(1, 1), (1, 9), (9, 1), (3, 5), (8, 8), (13, 7), (17, 11)]   #(w, h), most of them do not fill the last byte
+
+
+def random_mask(w, h, density, seed=0):
+    return np.random.default_rng(seed).random((h, w)) < density
+
+
+def patch_mask(patch):
+    return ObstacleMap.from_string(patch["bitmap"], patch["w"], patch["h"]).mask()
+
+
+@pytest.mark.parametrize("w, h", SIZES)
+@pytest.mark.parametrize("density", [0.0, 0.3, 1.0])
+def test_bitmap_matches_mask(w, h, density):
+    mask = random_mask(w, h, density, w*h)
+    obstacles = ObstacleMap.from_mask(mask)
+    assert len(obstacles.bits) == (w*h + 7)//8
+    np.testing.assert_array_equal(obstacles.mask(), mask)
+    assert obstacles.count() == mask.sum()
+    for x in range(w):
+        for y in range(h):
+            assert obstacles.blocked(x, y) == mask[y, x]
+
+
+@pytest.mark.parametrize("w, h", SIZES)
+def test_string_round_trip(w, h):
+    mask = random_mask(w, h, 0.4, w + h)
+    data = ObstacleMap.from_mask(mask).to_string()
+    np.testing.assert_array_equal(ObstacleMap.from_string(data, w, h).mask(), mask)
+    np.testing.assert_array_equal(ObstacleMap.from_config({"width": w, "height": h, "obstacles": data}).mask(), mask)
+
+
+def test_config_without_obstacles():
+    obstacles = ObstacleMap.from_config({"width": 6, "height": 4})
+    assert obstacles.count() == 0
+    assert not obstacles.mask().any()
+
+
+def test_bitmap_of_the_wrong_size():
+    with pytest.raises(ValueError):
+        ObstacleMap(8, 8, bytes(7))
+
+
+@pytest.mark.parametrize("w, h", SIZES)
+@pytest.mark.parametrize("radius", [0, 1, 2, 5])
+def test_patch(w, h, radius):
+    """ The patch of every cell is the slice of the mask around it, clipped to the map """
+    mask = random_mask(w, h, 0.4, w*h + radius)
+    obstacles = ObstacleMap.from_mask(mask)
+    for x in range(w):
+        for y in range(h):
+            patch = obstacles.patch(x, y, radius)
+            x0, y0 = max(x - radius, 0), max(y - radius, 0)
+            expected = mask[y0:y + radius + 1, x0:x + radius + 1]
+            assert (patch["x"], patch["y"]) == (x0, y0)
+            assert (patch["h"], patch["w"]) == expected.shape
+            np.testing.assert_array_equal(patch_mask(patch), expected)
@@ -0,0 +1,109 @@
+""" Distance fields and moves of the planner (scripts/planner.py) against a breadth-first search on a queue """
+
+import os, sys
+from collections import deque
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from planner import distance_field, Planner
+
+
+SIZES = [(1, 1), (1, 6), (7, 1), (8, 8), (15, 9)]
+NB_CASES = 20
+
+
+""" REFERENCE IMPLEMENTATION """
+
+def bfs_field(target, w, h, obstacles):
+    field = np.full((w, h), np.inf)
+    field[target] = 0
+    queue = deque([target])
+    while queue:
+        x, y = queue.popleft()
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                i, j = x + dx, y + dy
+                if 0 <= i < w and 0 <= j < h and not obstacles[i, j] and field[i, j] == np.inf:
+                    field[i, j] = field[x, y] + 1
+                    queue.append((i, j))
+    return field
+
+
+def loop_next_cell(x, y, target, field):
+    w, h = field.shape
+    best, best_key = None, None
+    for i in range(max(x-1, 0), min(x+2, w)):
+        for j in range(max(y-1, 0), min(y+2, h)):
+            key = (field[i, j], np.hypot(i - target[0], j - target[1]))
+            if best_key is None or key < best_key:
+                best, best_key = (i, j), key
+    return best
+
+
+def random_case(rng, w, h, density):
+    obstacles = rng.random((w, h)) < density
+    target = (int(rng.integers(w)), int(rng.integers(h)))
+    return target, obstacles
+
+
+""" TESTS """
+
+@pytest.mark.parametrize("w, h", SIZES)
+@pytest.mark.parametrize("density", [0.0, 0.2, 0.5])
+def test_distance_field(w, h, density):
+    rng = np.random.default_rng(w*h)
+    for _ in range(NB_CASES):
+        target, obstacles = random_case(rng, w, h, density)
+        np.testing.assert_array_equal(distance_field(target, w, h, obstacles), bfs_field(target, w, h, obstacles))
+
+
+@pytest.mark.parametrize("w, h", SIZES)
+def test_distance_field_without_obstacles(w, h):
+    """ Chebyshev shortcut of the empty maps """
+    rng = np.random.default_rng(w + h)
+    for _ in range(NB_CASES):
+        target, obstacles = random_case(rng, w, h, 0.0)
+        expected = bfs_field(target, w, h, obstacles)
+        np.testing.assert_array_equal(distance_field(target, w, h), expected)
+        np.testing.assert_array_equal(distance_field(target, w, h, obstacles), expected)
+
+
+@pytest.mark.parametrize("w, h", SIZES)
+@pytest.mark.parametrize("density", [0.0, 0.3])
+def test_next_cell(w, h, density):
+    rng = np.random.default_rng(w*h + 1)
+    for _ in range(NB_CASES):
+        target, obstacles = random_case(rng, w, h, density)
+        planner = Planner(w, h, obstacles)
+        field = bfs_field(target, w, h, obstacles)
+        for x in range(w):
+            for y in range(h):
+                assert planner.next_cell(x, y, target) == loop_next_cell(x, y, target, field)
+
+
+def test_path_length():
+    """ Following next_cell from a cell that can reach the target takes exactly its distance in moves """
+    rng = np.random.default_rng(0)
+    w, h = 20, 20
+    for _ in range(NB_CASES):
+        target, obstacles = random_case(rng, w, h, 0.3)
+        planner = Planner(w, h, obstacles)
+        field = planner.field(target)
+        for x, y in np.argwhere(np.isfinite(field)):
+            cell, nb_moves = (int(x), int(y)), 0
+            while cell != target:
+                cell = planner.next_cell(*cell, target)
+                assert cell == target or not obstacles[cell]  #the target itself may be an obstacle
+                nb_moves += 1
+            assert nb_moves == field[x, y]
+
+
+def test_set_obstacles_drops_the_fields():
+    planner = Planner(5, 5)
+    assert planner.field((0, 0))[4, 4] == 4
+    obstacles = np.zeros((5, 5), dtype=bool)
+    obstacles[1, :4] = obstacles[3, 1:] = True
+    planner.set_obstacles(obstacles)
+    np.testing.assert_array_equal(planner.field((0, 0)), bfs_field((0, 0), 5, 5, obstacles))
@@ -0,0 +1,128 @@
+""" Round trips of the wire protocol (scripts/protocol.py): struct layouts, pickle fallback and streaming decoder """
+
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from my_constants import *
+from protocol import encode, decode, Decoder, LAYOUTS, ARRAY_LAYOUTS, LENGTH, PICKLE_TAG
+
+
+NB_CASES = 200
+
+
+""" MESSAGES OF EACH LAYOUT """
+
+def random_value(rng, key):
+    if key in ("direction", "directions"):
+        return int(rng.integers(0, 9))
+    if key == "cell_val":
+        return float(rng.choice([0, 0.25, 0.3, 0.5, 0.6, 1]))
+    return int(rng.integers(-2**31, 2**31))
+
+
+def layout_msg(layout, rng):
+    tag, header, keys, fmt, from_game = layout
+    msg = {"sender": GAME_ID} if from_game else {}
+    msg["header"] = header
+    for key in keys[2 if from_game else 1:]:
+        msg[key] = random_value(rng, key)
+    return msg
+
+
+def array_layout_msg(layout, rng, n):
+    tag, header, keys, fmt, from_game = layout
+    msg = {"sender": GAME_ID} if from_game else {}
+    msg["header"] = header
+    for key in keys[2 if from_game else 1:]:
+        msg[key] = [random_value(rng, key) for _ in range(n)]
+    return msg
+
+
+def random_messages(rng, nb):
+    """ Messages of every layout and pickled ones """
+    messages = []
+    for _ in range(nb):
+        kind = rng.integers(0, 3)
+        if kind == 0:
+            messages.append(layout_msg(LAYOUTS[rng.integers(len(LAYOUTS))], rng))
+        elif kind == 1:
+            messages.append(array_layout_msg(ARRAY_LAYOUTS[rng.integers(len(ARRAY_LAYOUTS))], rng, int(rng.integers(0, 20))))
+        else:
+            messages.append({"sender": int(rng.integers(0, 4)), "header": BROADCAST_MSG, "Msg type": KEY_DISCOVERED, "position": (1, 2), "owner": 0})
+    return messages
+
+
+def tag_of(frame):
+    return frame[LENGTH.size]
+
+
+""" TESTS """
+
+@pytest.mark.parametrize("layout", LAYOUTS, ids=lambda layout: str(layout[0]))
+def test_layout_round_trip(layout):
+    rng = np.random.default_rng(layout[0])
+    for _ in range(NB_CASES):
+        msg = layout_msg(layout, rng)
+        frame = encode(msg)
+        assert tag_of(frame) == layout[0]
+        assert LENGTH.unpack_from(frame)[0] == len(frame) - LENGTH.size
+        assert decode(frame[LENGTH.size:]) == msg
+
+
+@pytest.mark.parametrize("layout", ARRAY_LAYOUTS, ids=lambda layout: str(layout[0]))
+@pytest.mark.parametrize("n", [0, 1, 8, 100])
+def test_array_layout_round_trip(layout, n):
+    rng = np.random.default_rng(layout[0]*1000 + n)
+    for _ in range(NB_CASES // 4):
+        msg = array_layout_msg(layout, rng, n)
+        frame = encode(msg)
+        assert tag_of(frame) == layout[0]
+        assert decode(frame[LENGTH.size:]) == msg
+
+
+@pytest.mark.parametrize("msg", [
+    {"header": MOVE, "direction": 300},     #does not fit in a byte
+    {"header": MOVE, "direction": 1, "extra": 0},   #other keys
+    {"sender": 0, "header": MOVE, "x": 1, "y": 2, "cell_val": 0.5},    #not sent by the game
+    {"sender": GAME_ID, "header": GET_DATA, "x": 1, "y": 2, "w": 2**40, "h": 3, "cell_val": 0.0},
+    {"header": STEP, "directions": [1, 2], "agents": [0]},  #lists of different lengths
+    {"header": STEP, "directions": [-1]},
+    {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": None},
+    "a string", 42, None,
+])
+def test_pickle_fallback_round_trip(msg):
+    frame = encode(msg)
+    assert tag_of(frame) == PICKLE_TAG
+    assert decode(frame[LENGTH.size:]) == msg
+
+
+def test_decoder_random_splits():
+    rng = np.random.default_rng(0)
+    for _ in range(NB_CASES // 4):
+        messages = random_messages(rng, int(rng.integers(1, 30)))
+        stream = b"".join(encode(msg) for msg in messages)
+        cuts = np.sort(rng.choice(np.arange(1, len(stream)), size=min(len(stream) - 1, int(rng.integers(0, 40))), replace=False))
+        decoder, received = Decoder(), []
+        for start, end in zip([0, *cuts], [*cuts, len(stream)]):
+            received += decoder.feed(stream[start:end])
+        assert received == messages
+        assert len(decoder.buffer) == 0
+
+
+def test_decoder_byte_by_byte():
+    messages = random_messages(np.random.default_rng(1), 20)
+    stream = b"".join(encode(msg) for msg in messages)
+    decoder, received = Decoder(), []
+    for i in range(len(stream)):
+        received += decoder.feed(stream[i:i+1])
+    assert received == messages
+
+
+def test_decoder_coalesced_frames():
+    messages = random_messages(np.random.default_rng(2), 50)
+    decoder = Decoder()
+    assert decoder.feed(b"".join(encode(msg) for msg in messages)) == messages
+    assert decoder.feed(b"") == []